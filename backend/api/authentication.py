@@ -0,0 +1,145 @@
+'''Аутентификация по токену с кэшем token -> пользователь.
+
+TokenAuthentication делает запрос Token + User на каждый запрос
+с заголовком Authorization. Здесь найденный пользователь кэшируется
+на TOKEN_AUTH_CACHE_TIMEOUT секунд в кэше TOKEN_AUTH_CACHE_ALIAS.
+Запись удаляется при удалении токена (выход через
+/api/auth/token/logout/) и при сохранении пользователя (смена пароля,
+деактивация), см. api/signals.py.
+
+Кэш используется, только если он общий для всех процессов: тогда
+отозванный токен перестаёт действовать сразу. Если у алиаса кэш в
+памяти процесса (LocMemCache, как CACHES по умолчанию) или заглушка,
+кэширование выключено. TOKEN_AUTH_CACHE_ALIAS = 'local' явно включает
+кэш в памяти процесса (не больше TOKEN_AUTH_CACHE_SIZE записей,
+вытесняются давно не использованные). Он очищается только в том
+процессе, где произошло изменение, поэтому в остальных воркерах
+отозванный токен или деактивированный пользователь действуют ещё до
+TOKEN_AUTH_CACHE_TIMEOUT секунд; годится только для одного воркера.
+'''
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+from api.metrics import registry
+
+
+class TokenCache:
+    '''Кэш в памяти процесса, ограниченный по размеру и времени.'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.items[key] = (time.monotonic() + timeout, value)
+            self.items.move_to_end(key)
+            while len(self.items) > settings.TOKEN_AUTH_CACHE_SIZE:
+                self.items.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+local_cache = TokenCache()
+
+LOCAL = 'local'
+
+
+def shared_key(key):
+    # Сам токен в общий кэш не попадает.
+    return f'token-auth:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def get_backend():
+    '''Общий кэш Django, local_cache или None, если кэш выключен.'''
+    alias = settings.TOKEN_AUTH_CACHE_ALIAS
+    if not settings.TOKEN_AUTH_CACHE_TIMEOUT or not alias:
+        return None
+    if alias == LOCAL:
+        return local_cache
+    cache = caches[alias]
+    if isinstance(cache, (LocMemCache, DummyCache)):
+        return None
+    return cache
+
+
+def get_cached_user(backend, key):
+    if backend is local_cache:
+        return local_cache.get(key)
+    return backend.get(shared_key(key))
+
+
+def cache_user(backend, key, user):
+    timeout = settings.TOKEN_AUTH_CACHE_TIMEOUT
+    if backend is local_cache:
+        local_cache.set(key, user, timeout)
+    else:
+        backend.set(shared_key(key), user, timeout)
+
+
+def invalidate_tokens(keys):
+    '''Удаляет токены из кэша сразу и ещё раз после фиксации
+    транзакции: иначе параллельный запрос успел бы закэшировать
+    пользователя, прочитанного до изменения.'''
+    backend = get_backend()
+    if backend is None:
+        return
+    keys = list(keys)
+    if not keys:
+        return
+
+    def invalidate():
+        if backend is local_cache:
+            local_cache.delete_many(keys)
+        else:
+            backend.delete_many([shared_key(key) for key in keys])
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        backend = get_backend()
+        if backend is None:
+            return super().authenticate_credentials(key)
+        user = get_cached_user(backend, key)
+        registry.inc('foodgram_cache_requests_total', cache='token',
+                     result='miss' if user is None else 'hit')
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            cache_user(backend, key, user)
+            return user, token
+        # Копия: представление может менять request.user.
+        user = copy.copy(user)
+        return user, self.get_model()(key=key, user=user)
@@ -0,0 +1,111 @@
+'''Кэширование ответов справочников (теги, ингредиенты).
+
+Для каждой модели справочника в кэше хранится версия и время
+последнего изменения. Сигналы сохранения и удаления меняют версию,
+поэтому старые ключи ответов просто перестают использоваться.
+Клиенту отдаются ETag и Last-Modified; повторный запрос с
+If-None-Match / If-Modified-Since получает 304 без обращения к базе.
+
+Состояние тоже живёт CATALOGUE_CACHE_TIMEOUT секунд. С кэшем в памяти
+процесса (по умолчанию) изменения, сделанные в другом процессе
+(load_ingredients, другой воркер), видны только после его истечения,
+после чего выдаётся новая версия. Чтобы изменения были видны сразу,
+нужен общий кэш (CACHE_BACKEND).
+'''
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import (http_date, parse_etags,
+                               parse_http_date_safe, quote_etag)
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.metrics import registry
+
+
+def get_cache():
+    return caches[settings.CATALOGUE_CACHE_ALIAS]
+
+
+def state_key(model):
+    return f'catalogue:{model._meta.label_lower}:state'
+
+
+def get_catalogue_state(model):
+    '''Версия и время последнего изменения справочника.'''
+    cache = get_cache()
+    state = cache.get(state_key(model))
+    if state is None:
+        # Состояние вытеснено или ещё не создано: новая версия
+        # не совпадёт ни с одним ранее выданным ETag.
+        now = time.time()
+        state = (int(now * 1000), int(now))
+        cache.add(state_key(model), state, settings.CATALOGUE_CACHE_TIMEOUT)
+        state = cache.get(state_key(model), state)
+    return state
+
+
+def bump_catalogue_version(model):
+    cache = get_cache()
+    version, _ = cache.get(state_key(model), (0, 0))
+    now = time.time()
+    cache.set(
+        state_key(model),
+        (max(version + 1, int(now * 1000)), int(now)),
+        settings.CATALOGUE_CACHE_TIMEOUT
+    )
+
+
+def is_not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags
+    if_modified_since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE', '')
+    )
+    return (if_modified_since is not None
+            and last_modified <= if_modified_since)
+
+
+class CatalogueCacheMixin:
+    '''Кэширует list и retrieve вьюсета справочника и отвечает
+    на условные GET-запросы.'''
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, view, request, *args, **kwargs):
+        model = self.get_queryset().model
+        version, last_modified = get_catalogue_state(model)
+        etag = quote_etag(
+            f'{model._meta.model_name}-{version}'
+            f'-{request.accepted_renderer.format}'
+        )
+        headers = {'ETag': etag, 'Last-Modified': http_date(last_modified)}
+        if is_not_modified(request, etag, last_modified):
+            registry.inc('foodgram_cache_requests_total', cache='catalogue',
+                         result='not_modified')
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers=headers)
+
+        cache = get_cache()
+        key = (f'catalogue:{model._meta.label_lower}:{version}:'
+               f'{request.accepted_renderer.format}:'
+               f'{request.get_full_path()}')
+        data = cache.get(key)
+        registry.inc('foodgram_cache_requests_total', cache='catalogue',
+                     result='miss' if data is None else 'hit')
+        if data is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            cache.set(key, data, settings.CATALOGUE_CACHE_TIMEOUT)
+        return Response(data, headers=headers)
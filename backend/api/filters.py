@@ -1,7 +1,13 @@
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
 import django_filters
+from django_filters.widgets import BooleanWidget
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
 
 User = get_user_model()
 
@@ -10,12 +16,48 @@ class RecipeFilter(django_filters.FilterSet):
     tags = django_filters.ModelMultipleChoiceFilter(
         queryset=Tag.objects.all(),
         field_name='tags__slug',
-        to_field_name='slug'
+        to_field_name='slug',
+        method='filter_tags'
+    )
+    author = django_filters.NumberFilter(field_name='author')
+    is_favorited = django_filters.BooleanFilter(
+        method='filter_is_favorited',
+        widget=BooleanWidget()
+    )
+    is_in_shopping_cart = django_filters.BooleanFilter(
+        method='filter_is_in_shopping_cart',
+        widget=BooleanWidget()
     )
 
     class Meta:
         model = Recipe
-        fields = ('tags',)
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+
+    def filter_user_list(self, queryset, model, value):
+        '''Полусоединение (EXISTS) со списком текущего пользователя:
+        проверка идёт по индексу (user, recipe) его избранного или
+        корзины.'''
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none() if value else queryset
+        in_list = Exists(model.objects.filter(user=user,
+                                              recipe=OuterRef('pk')))
+        return queryset.filter(in_list if value else ~in_list)
+
+    def filter_is_favorited(self, queryset, name, value):
+        return self.filter_user_list(queryset, Favorite, value)
+
+    def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_user_list(queryset, ShoppingCart, value)
+
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        if (settings.RECIPE_TAGS_FILTER == 'mask'
+                and all(tag.bit for tag in value)):
+            mask = reduce(or_, (tag.bit for tag in value))
+            return queryset.filter(tags_mask__in=Tag.masks_matching(mask))
+        return queryset.filter(tags__in=value).distinct()
 
 
 class IngredientFilter(django_filters.FilterSet):
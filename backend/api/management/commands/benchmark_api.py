@@ -0,0 +1,194 @@
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.pagination import PageLimitNumberPagination
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = (len(values) - 1) * percent / 100
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный замер эндпоинтов API внутри процесса: '
+            'задержки p50/p95/p99, число SQL-запросов и выделения памяти '
+            'на запрос. Данные можно создать командой generate_data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            dest='endpoints',
+            help='Имя эндпоинта (можно несколько раз), по умолчанию все.'
+        )
+        parser.add_argument(
+            '--user',
+            help='email пользователя, от имени которого идут запросы '
+                 '(по умолчанию — с наибольшим числом подписок).'
+        )
+        parser.add_argument('--output', help='Записать результат в JSON.')
+
+    def get_user(self, email):
+        if email:
+            return User.objects.get(email=email)
+        user = User.objects.annotate(
+            subscriptions=Count('subscriber')
+        ).order_by('-subscriptions', 'pk').first()
+        if user is None:
+            raise CommandError('Нет пользователей, запустите generate_data.')
+        return user
+
+    def endpoints(self, user):
+        recipe = Recipe.objects.order_by('-pub_date').first()
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        if recipe is None or tag is None or ingredient is None:
+            raise CommandError('Нет рецептов, запустите generate_data.')
+        # Глубокая страница — 50-я или последняя, если рецептов меньше;
+        # при единственной странице эндпоинт не замеряется.
+        pages = math.ceil(
+            Recipe.objects.count() / PageLimitNumberPagination.page_size
+        )
+        deep_page = (
+            f'/api/recipes/?page={min(pages, 50)}' if pages > 1 else None
+        )
+        endpoints = {
+            'recipes-list': '/api/recipes/',
+            'recipes-list-limit-50': '/api/recipes/?limit=50',
+            'recipes-list-deep-page': deep_page,
+            'recipes-list-cursor': '/api/recipes/?pagination=cursor',
+            'recipes-list-tags': f'/api/recipes/?tags={tag.slug}',
+            'recipes-list-favorited': '/api/recipes/?is_favorited=1',
+            'recipes-popular': '/api/recipes/popular/',
+            'recipes-feed': '/api/recipes/feed/',
+            'recipes-detail': f'/api/recipes/{recipe.pk}/',
+            'download-shopping-cart':
+                '/api/recipes/download_shopping_cart/',
+            'users-list': '/api/users/',
+            'users-me': '/api/users/me/',
+            'subscriptions': '/api/users/subscriptions/?recipes_limit=3',
+            'tags': '/api/tags/',
+            'ingredients-search':
+                f'/api/ingredients/?name={ingredient.name[:3]}',
+            'ingredient-detail': f'/api/ingredients/{ingredient.pk}/',
+        }
+        return {name: url for name, url in endpoints.items() if url}
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            body = b''.join(response.streaming_content)
+        else:
+            body = response.content
+        if response.status_code >= 400:
+            raise CommandError(f'{url}: {response.status_code} {body[:200]}')
+        return body
+
+    def measure(self, client, url, requests, warmup):
+        for _ in range(warmup):
+            self.request(client, url)
+        timings, queries = [], []
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                body = self.request(client, url)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+
+        # Отдельный проход: tracemalloc замедляет запросы.
+        allocations = []
+        tracemalloc.start()
+        for _ in range(min(requests, 10)):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            self.request(client, url)
+            _, peak = tracemalloc.get_traced_memory()
+            allocations.append(peak - before)
+        tracemalloc.stop()
+
+        return {
+            'url': url,
+            'requests': requests,
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'queries': max(queries),
+            'peak_alloc_kb': round(statistics.median(allocations) / 1024, 1),
+            'response_kb': round(len(body) / 1024, 1),
+        }
+
+    def git_revision(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        client = APIClient()
+        client.force_authenticate(user)
+        endpoints = self.endpoints(user)
+        selected = options['endpoints'] or list(endpoints)
+        unknown = set(selected) - set(endpoints)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные эндпоинты: {", ".join(sorted(unknown))}. '
+                f'Доступны: {", ".join(endpoints)}.'
+            )
+
+        results = {}
+        self.stdout.write(
+            f'{"эндпоинт":<26}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"запросов":>10}{"память, КБ":>12}'
+        )
+        for name in selected:
+            result = self.measure(client, endpoints[name],
+                                  options['requests'], options['warmup'])
+            results[name] = result
+            self.stdout.write(
+                f'{name:<26}{result["p50_ms"]:>9.2f}{result["p95_ms"]:>9.2f}'
+                f'{result["p99_ms"]:>9.2f}{result["queries"]:>10}'
+                f'{result["peak_alloc_kb"]:>12.1f}'
+            )
+
+        if options['output']:
+            report = {
+                'revision': self.git_revision(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'user': user.email,
+                'recipes': Recipe.objects.count(),
+                'users': User.objects.count(),
+                'endpoints': results,
+            }
+            with open(options['output'], 'w', encoding='UTF-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Результат записан в {options["output"]}.'
+            ))
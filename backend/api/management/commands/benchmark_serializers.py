@@ -0,0 +1,115 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.management.commands.benchmark_api import percentile
+from api.render import FastJSONRenderer, orjson
+from api.serializers import RecipeRepresentationSerializer, RecipeRowSerializer
+from api.views import RecipeViewSet
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Микробенчмарк вывода списка рецептов: время выборки '
+            'с сериализацией и время рендеринга JSON в пересчёте на один '
+            'рецепт для RecipeRepresentationSerializer и '
+            'RecipeRowSerializer, JSONRenderer и FastJSONRenderer.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=50,
+                            help='Рецептов на странице.')
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--user',
+            help='email пользователя (по умолчанию — аноним).'
+        )
+        parser.add_argument('--output', help='Записать результат в JSON.')
+
+    def get_view(self, email):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        if email:
+            request.user = User.objects.get(email=email)
+        return RecipeViewSet(request=request, action='list',
+                             format_kwarg=None, kwargs={})
+
+    def serializers(self, view, count):
+        context = view.get_serializer_context()
+
+        def drf():
+            page = list(view.get_queryset()[:count])
+            return RecipeRepresentationSerializer(page, many=True,
+                                                  context=context).data
+
+        def fast():
+            page = list(RecipeRowSerializer.rows(view.get_queryset())[:count])
+            return RecipeRowSerializer(page, many=True, context=context).data
+
+        return {'drf': drf, 'fast': fast}
+
+    def measure(self, function, repeat, warmup, count):
+        for _ in range(warmup):
+            function()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - started) * 1e6 / count)
+        return {
+            'p50_us': round(percentile(timings, 50), 1),
+            'p95_us': round(percentile(timings, 95), 1),
+            'mean_us': round(statistics.mean(timings), 1),
+        }
+
+    def handle(self, *args, **options):
+        view = self.get_view(options['user'])
+        count = min(options['recipes'], view.get_queryset().count())
+        if not count:
+            raise CommandError('Нет рецептов, запустите generate_data.')
+        serializers = self.serializers(view, count)
+        if json.dumps(serializers['drf']()) != json.dumps(
+            serializers['fast']()
+        ):
+            raise CommandError('Вывод RecipeRowSerializer отличается '
+                               'от RecipeRepresentationSerializer.')
+
+        data = serializers['fast']()
+        renderers = {'json': JSONRenderer()}
+        if orjson is not None:
+            renderers['orjson'] = FastJSONRenderer()
+        else:
+            self.stdout.write('orjson не установлен, FastJSONRenderer '
+                              'не измеряется.')
+
+        results = {}
+        self.stdout.write(f'Рецептов на странице: {count}, '
+                          f'мкс на рецепт.')
+        self.stdout.write(f'{"этап":<28}{"p50":>9}{"p95":>9}{"среднее":>9}')
+        stages = [(f'serialize-{name}', function)
+                  for name, function in serializers.items()]
+        stages += [(f'render-{name}', lambda renderer=renderer:
+                    renderer.render(data))
+                   for name, renderer in renderers.items()]
+        for name, function in stages:
+            result = self.measure(function, options['repeat'],
+                                  options['warmup'], count)
+            results[name] = result
+            self.stdout.write(
+                f'{name:<28}{result["p50_us"]:>9.1f}{result["p95_us"]:>9.1f}'
+                f'{result["mean_us"]:>9.1f}'
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='UTF-8') as file:
+                json.dump({'recipes': count, 'stages': results}, file,
+                          ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Результат записан в {options["output"]}.'
+            ))
@@ -0,0 +1,176 @@
+import http.client
+import json
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+from django.core.management import BaseCommand, CommandError
+
+from api.management.commands.benchmark_api import percentile
+
+DEFAULT_PATHS = (
+    '/api/tags/',
+    '/api/ingredients/?name=мол',
+    '/api/recipes/',
+    '/api/recipes/?limit=50',
+    '/api/recipes/{recipe_id}/',
+)
+AUTH_PATHS = (
+    '/api/recipes/download_shopping_cart/',
+)
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный замер запущенного сервера по HTTP: пропускная '
+            'способность и задержки при разном числе одновременных '
+            'клиентов. Для сравнения режимов укажите несколько --url, '
+            'например gunicorn с SERVER_MODE=wsgi и SERVER_MODE=asgi.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            action='append',
+            dest='urls',
+            help='Адрес сервера (можно несколько раз), '
+                 'по умолчанию http://127.0.0.1:8000.'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            nargs='+',
+            default=[1, 16, 64]
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=10,
+            help='Секунд на каждый уровень нагрузки.'
+        )
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Путь запроса (можно несколько раз, запросы идут '
+                 'по кругу), по умолчанию справочники и рецепты.'
+        )
+        parser.add_argument(
+            '--token',
+            help='Токен пользователя: добавляет выгрузку списка покупок.'
+        )
+        parser.add_argument('--output', help='Записать результат в JSON.')
+
+    def connect(self, url):
+        parts = urlsplit(url)
+        connection_class = (http.client.HTTPSConnection
+                            if parts.scheme == 'https'
+                            else http.client.HTTPConnection)
+        return connection_class(parts.netloc, timeout=60)
+
+    def fetch(self, connection, path, headers):
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        body = response.read()
+        return response.status, body
+
+    def resolve_paths(self, url, paths, headers):
+        connection = self.connect(url)
+        try:
+            status, body = self.fetch(connection, '/api/recipes/?limit=1',
+                                      headers)
+        finally:
+            connection.close()
+        if status != 200:
+            raise CommandError(f'{url}: /api/recipes/ вернул {status}.')
+        results = json.loads(body)['results']
+        if not results:
+            raise CommandError(f'{url}: нет рецептов, запустите '
+                               f'generate_data.')
+        return [quote(path.format(recipe_id=results[0]['id']),
+                      safe='/?=&%')
+                for path in paths]
+
+    def run_level(self, url, paths, headers, concurrency, duration):
+        '''concurrency клиентов с keep-alive соединениями шлют запросы
+        по кругу в течение duration секунд.'''
+        timings, errors = [], []
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def client(number):
+            connection = self.connect(url)
+            index = number
+            local_timings, local_errors = [], 0
+            while time.monotonic() < deadline:
+                path = paths[index % len(paths)]
+                index += 1
+                started = time.perf_counter()
+                try:
+                    status, _ = self.fetch(connection, path, headers)
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    connection = self.connect(url)
+                    local_errors += 1
+                    continue
+                if status >= 400:
+                    local_errors += 1
+                local_timings.append((time.perf_counter() - started) * 1000)
+            connection.close()
+            with lock:
+                timings.extend(local_timings)
+                errors.append(local_errors)
+
+        threads = [threading.Thread(target=client, args=(number,))
+                   for number in range(concurrency)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        if not timings:
+            raise CommandError(f'{url}: ни одного успешного запроса.')
+        return {
+            'concurrency': concurrency,
+            'requests': len(timings),
+            'errors': sum(errors),
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+        }
+
+    def handle(self, *args, **options):
+        urls = options['urls'] or ['http://127.0.0.1:8000']
+        paths = list(options['paths'] or DEFAULT_PATHS)
+        headers = {'Connection': 'keep-alive'}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+            if not options['paths']:
+                paths.extend(AUTH_PATHS)
+
+        results = {}
+        self.stdout.write(
+            f'{"сервер":<28}{"клиентов":>9}{"запр/с":>10}{"p50":>9}'
+            f'{"p95":>9}{"p99":>9}{"ошибок":>8}'
+        )
+        for url in urls:
+            url = url.rstrip('/')
+            resolved = self.resolve_paths(url, paths, headers)
+            results[url] = []
+            for concurrency in options['concurrency']:
+                result = self.run_level(url, resolved, headers, concurrency,
+                                        options['duration'])
+                results[url].append(result)
+                self.stdout.write(
+                    f'{url:<28}{concurrency:>9}{result["rps"]:>10.1f}'
+                    f'{result["p50_ms"]:>9.1f}{result["p95_ms"]:>9.1f}'
+                    f'{result["p99_ms"]:>9.1f}{result["errors"]:>8}'
+                )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='UTF-8') as file:
+                json.dump({'paths': paths, 'servers': results}, file,
+                          ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f'Результат записан в {options["output"]}.'
+            ))
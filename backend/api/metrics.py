@@ -0,0 +1,253 @@
+'''Метрики API в текстовом формате Prometheus (/api/metrics).
+
+Каждый процесс копит значения в памяти. Если задан METRICS_DIR,
+фоновый поток раз в METRICS_FLUSH_INTERVAL секунд сохраняет снимок
+процесса в отдельный файл каталога, а эндпоинт складывает снимки всех
+процессов: при нескольких воркерах gunicorn значения не теряются
+и не зависят от того, какой воркер принял запрос метрик. Счётчики
+завершившихся воркеров остаются в каталоге, его нужно очищать
+при развёртывании.
+'''
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from glob import glob
+
+from django.conf import settings
+from django.db import connections
+
+from api.profiling import RequestTimings
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+ROW_BUCKETS = (0, 10, 50, 100, 500, 1000, 5000)
+BYTE_BUCKETS = (1024, 10240, 102400, 1048576, 10485760)
+
+# Имя -> (тип, описание, границы корзин гистограммы).
+METRICS = {
+    'foodgram_request_duration_seconds': (
+        'histogram', 'Время обработки запроса действием вьюсета.',
+        LATENCY_BUCKETS
+    ),
+    'foodgram_db_queries': (
+        'histogram', 'Число SQL-запросов на запрос к действию вьюсета.',
+        QUERY_BUCKETS
+    ),
+    'foodgram_mutations_total': (
+        'counter', 'Добавления и удаления избранного, корзины и подписок.',
+        None
+    ),
+    'foodgram_shopping_list_export_rows': (
+        'histogram', 'Строк в выгруженном списке покупок.', ROW_BUCKETS
+    ),
+    'foodgram_shopping_list_export_bytes': (
+        'histogram', 'Размер выгруженного списка покупок.', BYTE_BUCKETS
+    ),
+    'foodgram_cache_requests_total': (
+        'counter', 'Обращения к кэшам справочников (catalogue) '
+                   'и токенов (token): hit, miss, not_modified.', None
+    ),
+}
+
+
+class Registry:
+    '''Значения метрик процесса: счётчик — число, гистограмма —
+    накопленные счётчики корзин, сумма и количество.'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+        atexit.register(self.flush)
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.path = None
+        self.values = {}
+        self.flusher = None
+
+    def inc(self, name, value=1, **labels):
+        self.update(name, value, labels)
+
+    def observe(self, name, value, **labels):
+        self.update(name, value, labels)
+
+    def update(self, name, value, labels):
+        if not settings.METRICS_ENABLED:
+            return
+        kind, _, buckets = METRICS[name]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if self.pid != os.getpid():
+                # Процесс форкнут после первой записи: значения
+                # и файл принадлежат родителю.
+                self.reset()
+            if kind == 'counter':
+                self.values[key] = self.values.get(key, 0) + value
+            else:
+                series = self.values.setdefault(key, [0] * (len(buckets) + 2))
+                for index, bound in enumerate(buckets):
+                    if value <= bound:
+                        series[index] += 1
+                series[-2] += value
+                series[-1] += 1
+            if settings.METRICS_DIR and self.flusher is None:
+                self.flusher = threading.Thread(
+                    target=self.flush_periodically, name='metrics-flush',
+                    daemon=True
+                )
+                self.flusher.start()
+
+    def flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        '''Сохраняет снимок процесса в METRICS_DIR.'''
+        if not settings.METRICS_DIR:
+            return
+        with self.lock:
+            if self.pid != os.getpid() or not self.values:
+                return
+            if self.path is None:
+                os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                self.path = os.path.join(
+                    settings.METRICS_DIR,
+                    f'{self.pid}-{uuid.uuid4().hex[:8]}.json'
+                )
+            snapshot = [[name, labels, value]
+                        for (name, labels), value in self.values.items()]
+            path = self.path
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w', encoding='UTF-8') as file:
+            json.dump(snapshot, file)
+        os.replace(temporary, path)
+
+    def collect(self):
+        '''Сумма значений всех процессов: своих — из памяти,
+        остальных — из их снимков.'''
+        totals = {}
+
+        def add(key, value):
+            if key not in totals:
+                totals[key] = list(value) if isinstance(value, list) else value
+            elif isinstance(value, list):
+                totals[key] = [a + b for a, b in zip(totals[key], value)]
+            else:
+                totals[key] += value
+
+        with self.lock:
+            own = list(self.values.items())
+            own_path = self.path
+        for key, value in own:
+            add(key, value)
+        if settings.METRICS_DIR:
+            for path in glob(os.path.join(settings.METRICS_DIR, '*.json')):
+                if path == own_path:
+                    continue
+                try:
+                    with open(path, encoding='UTF-8') as file:
+                        snapshot = json.load(file)
+                except (OSError, ValueError):
+                    continue
+                for name, labels, value in snapshot:
+                    if name in METRICS:
+                        add((name, tuple(map(tuple, labels))), value)
+        return totals
+
+    def render(self):
+        totals = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (metric, labels), value in sorted(totals.items()):
+                if metric != name:
+                    continue
+                if kind == 'counter':
+                    lines.append(f'{name}{format_labels(labels)} '
+                                 f'{format_value(value)}')
+                    continue
+                for bound, count in zip(buckets + ('+Inf',), value[:-2]
+                                        + [value[-1]]):
+                    bucket_labels = labels + (('le', format_value(bound)),)
+                    lines.append(f'{name}_bucket{format_labels(bucket_labels)}'
+                                 f' {count}')
+                lines.append(f'{name}_sum{format_labels(labels)} '
+                             f'{format_value(value[-2])}')
+                lines.append(f'{name}_count{format_labels(labels)} '
+                             f'{value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', r'\\')
+                         .replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in labels
+    )
+    return f'{{{pairs}}}'
+
+
+def format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+registry = Registry()
+
+
+class ExportMeter:
+    '''Считает строки и байты потоковой выгрузки списка покупок
+    и записывает их, когда поток дочитан.'''
+
+    def __init__(self, format):
+        self.format = format
+        self.rows = 0
+
+    def count_rows(self, rows):
+        for row in rows:
+            self.rows += 1
+            yield row
+
+    def stream(self, chunks):
+        size = 0
+        for chunk in chunks:
+            size += len(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield chunk
+        registry.observe('foodgram_shopping_list_export_rows', self.rows,
+                         format=self.format)
+        registry.observe('foodgram_shopping_list_export_bytes', size,
+                         format=self.format)
+
+
+class MetricsMixin:
+    '''Задержка и число SQL-запросов каждого действия вьюсета.
+    Для потоковых ответов учитывается только время до начала потока.'''
+
+    def dispatch(self, request, *args, **kwargs):
+        if not settings.METRICS_ENABLED:
+            return super().dispatch(request, *args, **kwargs)
+        timings = RequestTimings()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings))
+            response = super().dispatch(request, *args, **kwargs)
+        labels = {
+            'viewset': self.basename,
+            'action': self.action or request.method.lower(),
+        }
+        registry.observe('foodgram_request_duration_seconds',
+                         time.perf_counter() - timings.started,
+                         status=f'{response.status_code // 100}xx', **labels)
+        registry.observe('foodgram_db_queries', timings.queries, **labels)
+        return response
@@ -0,0 +1,122 @@
+'''Представления API для режима ASGI (SERVER_MODE=asgi).
+
+В Django 3.2 нет асинхронного ORM, а синхронные представления под ASGI
+выполняются в одном общем потоке, то есть по очереди. Поэтому в режиме
+ASGI представления API оборачиваются в асинхронные: запрос целиком
+выполняется в пуле потоков (размер — ASGI_THREADS), цикл событий
+не блокируется, медленные запросы не задерживают остальные.
+
+Обработчик ASGI в Django 3.2 читает потоковый ответ в цикле событий,
+где обращаться к базе нельзя. StreamingASGIHandler (foodgram/asgi.py)
+читает его по одной части в отдельном потоке, поэтому выгрузка списка
+покупок не собирается в памяти целиком.
+
+SQL-запросы представления выполняются в потоке пула: замеры
+ProfilingMiddleware переносятся в него в run_view, а cProfile видит
+только поток middleware.
+'''
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections, connections
+from django.urls import URLPattern, URLResolver
+
+END = object()
+
+
+def run_view(view, request, *args, **kwargs):
+    # Сигналы request_started/finished закрывают соединения только
+    # в основном потоке, соединения потока пула закрываются здесь.
+    close_old_connections()
+    timings = getattr(request, 'profiling_timings', None)
+    try:
+        with ExitStack() as stack:
+            if timings is not None:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and callable(response.render):
+                response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def offload(view):
+    '''Асинхронная обёртка синхронного представления.'''
+    if getattr(view, 'offloaded', False):
+        return view
+
+    @functools.wraps(view)
+    async def async_view(request, *args, **kwargs):
+        return await sync_to_async(run_view, thread_sensitive=False)(
+            view, request, *args, **kwargs
+        )
+
+    async_view.offloaded = True
+    return async_view
+
+
+def offload_patterns(patterns):
+    '''Оборачивает представления всех маршрутов, включая вложенные.'''
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            offload_patterns(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            pattern.callback = offload(pattern.callback)
+    return patterns
+
+
+def close_stream(response):
+    try:
+        response.close()
+    finally:
+        # Поток чтения ответа завершается, его соединения не нужны.
+        connections.close_all()
+
+
+class StreamingASGIHandler(ASGIHandler):
+    '''Потоковый ответ читается по одной части в отдельном потоке:
+    все части одного ответа — в одном потоке, поэтому курсор базы,
+    открытый генератором, остаётся в своём соединении.'''
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        headers = [
+            (header.encode('ascii') if isinstance(header, str) else header,
+             value.encode('latin1') if isinstance(value, str) else value)
+            for header, value in response.items()
+        ]
+        headers.extend(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        )
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1,
+                                      thread_name_prefix='asgi-stream')
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': headers,
+            })
+            parts = iter(response)
+            while True:
+                part = await loop.run_in_executor(executor, next, parts, END)
+                if part is END:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            await send({'type': 'http.response.body'})
+        finally:
+            await loop.run_in_executor(executor, close_stream, response)
+            executor.shutdown(wait=False)
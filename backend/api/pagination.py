@@ -1,7 +1,147 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class PageLimitNumberPagination(PageNumberPagination):
 
     page_size = 6
     page_size_query_param = "limit"
+
+
+class KeysetCursorPagination(CursorPagination):
+    '''Курсор по значениям всех полей ordering.
+
+    CursorPagination DRF хранит в курсоре только первое поле, а строки
+    с одинаковым значением пропускает по offset; при переходе назад
+    через границу таких строк страницы теряют или повторяют рецепты.
+    Здесь позиция — значения всех полей через SEPARATOR, и следующая
+    страница выбирается сравнением кортежей:
+    (a < x) OR (a = x AND b < y).'''
+
+    SEPARATOR = "|"
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            name = order.lstrip("-")
+            values.append(instance[name] if isinstance(instance, dict)
+                          else getattr(instance, name))
+        return self.SEPARATOR.join(str(value) for value in values)
+
+    def position_filter(self, position, reverse):
+        values = position.split(self.SEPARATOR)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition, equal = Q(), Q()
+        for order, value in zip(self.ordering, values):
+            name = order.lstrip("-")
+            lookup = "lt" if order.startswith("-") != reverse else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Повторяет CursorPagination.paginate_queryset, кроме фильтра
+        # по позиции.
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*(
+                order[1:] if order.startswith("-") else f"-{order}"
+                for order in self.ordering
+            ))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            try:
+                queryset = queryset.filter(
+                    self.position_filter(current_position, reverse)
+                )
+            except (ValidationError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+        has_following_position = len(results) > len(self.page)
+        following_position = (
+            self._get_position_from_instance(results[-1], self.ordering)
+            if has_following_position else None
+        )
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+class RecipeCursorPagination(KeysetCursorPagination):
+    '''Пагинация ленты по ключу (pub_date, id) без OFFSET и COUNT(*).'''
+
+    page_size = 6
+    page_size_query_param = "limit"
+    ordering = ("-pub_date", "-id")
+
+
+class PopularityCursorPagination(KeysetCursorPagination):
+    '''Пагинация рейтинга по ключу (popularity_score, id); рейтинг
+    меняется при пересчёте, курсоры между пересчётами не сохраняются.'''
+
+    page_size = 6
+    page_size_query_param = "limit"
+    ordering = ("-popularity_score", "-id")
+
+
+class IdCursorPagination(CursorPagination):
+
+    page_size = 6
+    page_size_query_param = "limit"
+    ordering = ("id",)
+
+
+class CursorPaginationMixin:
+    '''Включает курсорную пагинацию по ?pagination=cursor (и по
+    параметру cursor из ссылок next/previous). Без них работает
+    обычная пагинация page/limit.'''
+
+    cursor_pagination_class = None
+
+    def use_cursor_pagination(self):
+        params = self.request.query_params
+        return (params.get("pagination") == "cursor"
+                or CursorPagination.cursor_query_param in params)
+
+    @property
+    def paginator(self):
+        if (not hasattr(self, "_paginator")
+                and self.cursor_pagination_class is not None
+                and self.use_cursor_pagination()):
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
@@ -0,0 +1,149 @@
+'''Профилирование запросов, включается PROFILING_ENABLED.
+
+Для каждого запроса измеряются общее время, число и время SQL-запросов,
+время представления без SQL (в основном сериализация) и время рендеринга
+ответа. Замеры отдаются в заголовке Server-Timing и пишутся в лог
+foodgram.profiling одной JSON-строкой на запрос.
+
+Доля PROFILING_SAMPLE_RATE запросов выполняется под cProfile; профиль
+сохраняется в PROFILING_DIR, если запрос шёл дольше PROFILING_SLOW_MS.
+В режиме ASGI запросы представления считаются в потоке пула
+(api/offload.py), а cProfile видит только поток middleware. Запросы,
+которые потоковый ответ делает уже после выхода из middleware,
+не учитываются.
+'''
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('foodgram.profiling')
+
+
+class RequestTimings:
+    '''Замеры одного запроса; экземпляр — обёртка execute_wrapper.'''
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.view_started = None
+        self.view_db = 0.0
+        self.serialize = None
+        self.render = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - started
+
+    def view_finished(self):
+        if self.view_started is not None and self.serialize is None:
+            self.serialize = (time.perf_counter() - self.view_started
+                              - (self.db - self.view_db))
+
+
+class ProfilingMiddleware:
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = request.profiling_timings = RequestTimings()
+        profiler = None
+        if (settings.PROFILING_DIR
+                and random.random() < settings.PROFILING_SAMPLE_RATE):
+            profiler = cProfile.Profile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timings))
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        timings.view_finished()
+        total = time.perf_counter() - timings.started
+
+        if settings.PROFILING_SERVER_TIMING:
+            response['Server-Timing'] = self.server_timing(timings, total)
+        logger.info(json.dumps(
+            self.record(request, response, timings, total),
+            ensure_ascii=False
+        ))
+        if profiler is not None and total * 1000 >= settings.PROFILING_SLOW_MS:
+            self.dump(profiler, request, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = request.profiling_timings
+        timings.view_started = time.perf_counter()
+        timings.view_db = timings.db
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся после этого метода: до него — работа
+        # представления, после — рендеринг.
+        timings = request.profiling_timings
+        timings.view_finished()
+        started, db = time.perf_counter(), timings.db
+
+        def rendered(response):
+            timings.render = (time.perf_counter() - started
+                              - (timings.db - db))
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def server_timing(timings, total):
+        metrics = [
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={timings.db * 1000:.1f};desc="{timings.queries} queries"',
+        ]
+        if timings.serialize is not None:
+            metrics.append(f'serialize;dur={timings.serialize * 1000:.1f}')
+        if timings.render is not None:
+            metrics.append(f'render;dur={timings.render * 1000:.1f}')
+        return ', '.join(metrics)
+
+    @staticmethod
+    def record(request, response, timings, total):
+        match = request.resolver_match
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 2)
+
+        return {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': ms(total),
+            'db_ms': ms(timings.db),
+            'queries': timings.queries,
+            'serialize_ms': ms(timings.serialize),
+            'render_ms': ms(timings.render),
+        }
+
+    @staticmethod
+    def dump(profiler, request, total):
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        path = re.sub(r'[^\w-]+', '_', request.path).strip('_') or 'root'
+        name = (f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-'
+                f'{request.method}-{path}-{total * 1000:.0f}ms.prof')
+        profiler.dump_stats(os.path.join(settings.PROFILING_DIR, name))
@@ -1,26 +1,97 @@
-import io
+import csv
+import json
+
 from rest_framework import renderers
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 SHOPPING_CART_HEADERS = ["ingredient", "measurement_unit", "amount"]
 
 
-class TXTShoppingCartRenderer(renderers.BaseRenderer):
+class FastJSONRenderer(renderers.JSONRenderer):
+    '''JSONRenderer на orjson, если он установлен.
+
+    Вывод тот же компактный UTF-8 JSON: даты, Decimal и ленивые строки
+    кодирует JSONEncoder DRF. Без orjson, с отступами (?indent или
+    Accept) и на значениях, которые orjson не кодирует, работает
+    стандартный JSONRenderer.'''
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None
+                or self.get_indent(accepted_media_type,
+                                   renderer_context or {})):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        try:
+            return orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=(orjson.OPT_NON_STR_KEYS
+                        | orjson.OPT_PASSTHROUGH_DATETIME)
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+
+
+class Echo:
+    '''Буфер для csv.writer, возвращающий записанную строку.'''
+
+    def write(self, value):
+        return value
+
+
+class ShoppingCartRenderer(renderers.BaseRenderer):
+    '''Базовый рендерер списка покупок.
+
+    Строки списка — кортежи (ingredient, measurement_unit, amount).
+    stream() отдаёт файл по частям для StreamingHttpResponse,
+    не накапливая его в памяти; по умолчанию — строка заголовков
+    и по строке на ингредиент, значения через пробел.'''
+
+    charset = "utf-8"
+
+    def stream(self, rows):
+        yield ' '.join(SHOPPING_CART_HEADERS) + '\n'
+        for row in rows:
+            yield ' '.join(str(value) for value in row) + '\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            # Ошибки (401, 404) приходят словарём, а не строками списка.
+            return ''.join(f'{key}: {value}\n' for key, value in data.items())
+        return ''.join(self.stream(data))
+
+
+class TXTShoppingCartRenderer(ShoppingCartRenderer):
 
     media_type = "text/plain"
     format = "txt"
 
-    def render(self, data, accepted_media_type=None, renderer_context=None):
 
-        text_buffer = io.StringIO()
-        text_buffer.write(
-            ' '.join(header for header in SHOPPING_CART_HEADERS) + '\n'
-        )
+class CSVShoppingCartRenderer(ShoppingCartRenderer):
 
-        for ingredients_data in data:
-            text_buffer.write(
-                ' '.join(
-                    str(sd) for sd in list(ingredients_data.values())
-                ) + '\n'
-            )
+    media_type = "text/csv"
+    format = "csv"
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(SHOPPING_CART_HEADERS)
+        for row in rows:
+            yield writer.writerow(row)
+
+
+class JSONLinesShoppingCartRenderer(ShoppingCartRenderer):
+
+    media_type = "application/x-ndjson"
+    format = "jsonl"
 
-        return text_buffer.getvalue()
+    def stream(self, rows):
+        for row in rows:
+            yield json.dumps(
+                dict(zip(SHOPPING_CART_HEADERS, row)),
+                ensure_ascii=False
+            ) + '\n'
@@ -0,0 +1,15 @@
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram.db.routers import replica_reads
+
+
+class ReplicaReadMixin:
+    '''Безопасные запросы (GET, HEAD, OPTIONS) к вьюсету читают
+    с реплики, если она настроена. Потоковый ответ дочитывается уже
+    после dispatch, то есть из default.'''
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads():
+            return super().dispatch(request, *args, **kwargs)
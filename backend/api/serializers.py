@@ -1,6 +1,12 @@
+import base64
+import binascii
+from collections import defaultdict
+from urllib.parse import urlsplit
+
 from django.core.validators import RegexValidator
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from djoser.serializers import (UserSerializer, UserCreateSerializer,
                                 ValidationError)
 from drf_extra_fields.fields import Base64ImageField
@@ -8,7 +14,7 @@ from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag)
 from users.models import Subscription
 
 User = get_user_model()
@@ -29,6 +35,31 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class RecipeImageField(serializers.ImageField):
+    '''URL изображения рецепта или его уменьшенной копии.
+
+    Вариант задаётся аргументом variant или ключом image_variant
+    в контексте; пока копия не готова, отдаётся оригинал.'''
+
+    def __init__(self, variant=None, **kwargs):
+        self.variant = variant
+        kwargs.setdefault('read_only', True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        variant = self.variant or self.context.get('image_variant')
+        name = None
+        if variant and value:
+            name = value.instance.image_variants.get(variant)
+        if not name:
+            return super().to_representation(value)
+        url = value.storage.url(name)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
 
     id = serializers.ReadOnlyField(source='ingredient.id')
@@ -42,21 +73,82 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class DownloadSCSerializer(serializers.Serializer):
+class RecipeImageUploadField(Base64ImageField):
+    '''Изображение рецепта в base64.
 
-    ingredient__name = serializers.CharField()
-    ingredient__measurement_unit = serializers.CharField()
-    amount = serializers.IntegerField()
+    Если при изменении рецепта прислано текущее изображение (его URL
+    или те же байты), поле пропускается: файл не проверяется заново
+    и не перезаписывается.'''
 
-    class Meta:
-        fields = ('name', 'measurement_unit', 'amount')
+    def to_internal_value(self, data):
+        if self.is_unchanged(data):
+            raise serializers.SkipField()
+        return super().to_internal_value(data)
+
+    def is_unchanged(self, data):
+        instance = getattr(self.parent, 'instance', None)
+        if instance is None or not instance.image or not isinstance(data,
+                                                                    str):
+            return False
+        image = instance.image
+        if ';base64,' not in data:
+            if urlsplit(data).path == urlsplit(image.url).path:
+                return True
+        else:
+            data = data.split(';base64,', 1)[1]
+        try:
+            decoded = base64.b64decode(data)
+            if image.storage.size(image.name) != len(decoded):
+                return False
+            with image.storage.open(image.name, 'rb') as file:
+                return file.read() == decoded
+        except (binascii.Error, ValueError, OSError):
+            return False
+
+
+class BulkRelatedListField(serializers.ListField):
+    '''Список ссылок на объекты queryset, проверяемый одним запросом
+    in_bulk вместо запроса на каждый элемент.
+
+    Элементы — первичные ключи или, если задан key, словари, в которых
+    ключ лежит под key. Повторы отклоняются; дальше передаются
+    найденные объекты (в словарях — вместо ключа).'''
+
+    default_error_messages = {
+        'duplicates': 'Значения не должны повторяться.',
+        'does_not_exist': 'Объекты не найдены: {pk_values}.',
+    }
+
+    def __init__(self, queryset, key=None, **kwargs):
+        self.queryset = queryset
+        self.key = key
+        kwargs.setdefault('child', serializers.IntegerField())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ids = [item[self.key] if self.key else item for item in items]
+        if len(set(ids)) != len(ids):
+            self.fail('duplicates')
+        objects = self.queryset.all().in_bulk(ids)
+        missing = [pk for pk in ids if pk not in objects]
+        if missing:
+            self.fail('does_not_exist',
+                      pk_values=', '.join(map(str, missing)))
+        if self.key is None:
+            return [objects[pk] for pk in ids]
+        for item in items:
+            item[self.key] = objects[item[self.key]]
+        return items
+
+    def to_representation(self, value):
+        if self.key is None:
+            return [obj.pk for obj in value.all()]
+        return super().to_representation(value)
 
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        source='ingredient',
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField(source='ingredient')
 
     class Meta:
         model = RecipeIngredient
@@ -78,6 +170,8 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -125,6 +219,7 @@ class RecipeRepresentationSerializer(serializers.ModelSerializer):
         source='ingredients_in_recipe'
     )
     author = CustomUserSerializer()
+    image = RecipeImageField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -143,7 +238,14 @@ class RecipeRepresentationSerializer(serializers.ModelSerializer):
             'cooking_time'
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -151,6 +253,8 @@ class RecipeRepresentationSerializer(serializers.ModelSerializer):
                                        recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -158,11 +262,107 @@ class RecipeRepresentationSerializer(serializers.ModelSerializer):
                                            recipe=obj).exists()
 
 
+class RecipeRowListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        rows = list(data)
+        self.child.load_related(rows)
+        return [self.child.to_representation(row) for row in rows]
+
+
+class RecipeRowSerializer(serializers.BaseSerializer):
+    '''Быстрый вывод рецептов для чтения (RECIPE_FAST_SERIALIZER).
+
+    Формат тот же, что у RecipeRepresentationSerializer, но словари
+    собираются напрямую из строк values() — см. rows(), без моделей
+    и полей DRF. Теги и ингредиенты всех рецептов читаются двумя
+    запросами values_list.'''
+
+    FIELDS = (
+        'id', 'name', 'image', 'image_variants', 'text', 'cooking_time',
+        'pub_date', 'author_id', 'author__email', 'author__username',
+        'author__first_name', 'author__last_name', 'is_favorited',
+        'is_in_shopping_cart', 'author_is_subscribed',
+    )
+
+    class Meta:
+        list_serializer_class = RecipeRowListSerializer
+
+    @classmethod
+    def rows(cls, queryset):
+        '''Выборка рецептов с аннотациями with_user_flags в виде
+        строк для сериализатора.'''
+        return queryset.prefetch_related(None).values(*cls.FIELDS)
+
+    def load_related(self, rows):
+        ids = [row['id'] for row in rows]
+        self.tags = defaultdict(list)
+        for recipe_id, *tag in Recipe.tags.through.objects.filter(
+            recipe_id__in=ids
+        ).order_by('tag_id').values_list(
+            'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug'
+        ):
+            self.tags[recipe_id].append(
+                dict(zip(('id', 'name', 'color', 'slug'), tag))
+            )
+        self.ingredients = defaultdict(list)
+        for recipe_id, *ingredient in RecipeIngredient.objects.filter(
+            recipe_id__in=ids
+        ).order_by('pk').values_list(
+            'recipe_id', 'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'
+        ):
+            self.ingredients[recipe_id].append(dict(zip(
+                ('id', 'name', 'measurement_unit', 'amount'), ingredient
+            )))
+
+    def image_url(self, row):
+        name = row['image']
+        variant = self.context.get('image_variant')
+        if name and variant:
+            name = (row['image_variants'] or {}).get(variant) or name
+        if not name:
+            return None
+        url = Recipe._meta.get_field('image').storage.url(name)
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def to_representation(self, row):
+        if not hasattr(self, 'tags'):
+            self.load_related([row])
+        return {
+            'id': row['id'],
+            'tags': self.tags[row['id']],
+            'author': {
+                'email': row['author__email'],
+                'id': row['author_id'],
+                'username': row['author__username'],
+                'first_name': row['author__first_name'],
+                'last_name': row['author__last_name'],
+                'is_subscribed': row['author_is_subscribed'],
+            },
+            'ingredients': self.ingredients[row['id']],
+            'is_favorited': row['is_favorited'],
+            'is_in_shopping_cart': row['is_in_shopping_cart'],
+            'name': row['name'],
+            'image': self.image_url(row),
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+        }
+
+
 class RecipeCreateSerializer(serializers.ModelSerializer):
     '''Для создания/изменения рецепта'''
 
-    ingredients = RecipeIngredientCreateSerializer(many=True)
-    image = Base64ImageField()
+    ingredients = BulkRelatedListField(
+        queryset=Ingredient.objects.all(),
+        key='ingredient',
+        child=RecipeIngredientCreateSerializer()
+    )
+    tags = BulkRelatedListField(queryset=Tag.objects.all(), allow_empty=False)
+    image = RecipeImageUploadField()
 
     class Meta:
         model = Recipe
@@ -186,6 +386,40 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         if recipeingredient_list:
             RecipeIngredient.objects.bulk_create(recipeingredient_list)
 
+    def sync_recipeingredient(self, recipe, ingredients):
+        '''Приводит ингредиенты рецепта к списку ingredients: удаляет,
+        изменяет и добавляет только отличающиеся строки.'''
+        new_amounts = {
+            item['ingredient'].pk: item['amount'] for item in ingredients
+        }
+        old_amounts = defaultdict(int)
+        wanted = dict(new_amounts)
+        stale, changed = [], []
+        for row in RecipeIngredient.objects.filter(recipe=recipe).only(
+            'pk', 'ingredient_id', 'amount'
+        ):
+            old_amounts[row.ingredient_id] += row.amount
+            amount = wanted.pop(row.ingredient_id, None)
+            if amount is None:
+                stale.append(row.pk)
+            elif amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        if stale:
+            RecipeIngredient.objects.filter(pk__in=stale).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if wanted:
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient_id=ingredient_id,
+                                 amount=amount)
+                for ingredient_id, amount in wanted.items()
+            )
+        if old_amounts != new_amounts:
+            ShoppingListItem.objects.recipe_changed(
+                recipe, old_amounts, new_amounts
+            )
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
@@ -195,19 +429,37 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        instance = super().update(instance, validated_data)
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        self.update_recipeingredient(instance, ingredients)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        changed = [
+            field for field, value in validated_data.items()
+            if getattr(instance, field) != value
+        ]
+        for field in changed:
+            setattr(instance, field, validated_data[field])
+        if changed:
+            instance.save(update_fields=changed)
+        if tags is not None and {tag.pk for tag in tags} != set(
+            instance.tags.values_list('pk', flat=True)
+        ):
+            instance.tags.set(tags)
+        if ingredients is not None:
+            self.sync_recipeingredient(instance, ingredients)
         return instance
 
     def to_representation(self, instance):
+        # Кэш prefetch сброшен записью: связанные строки читаются заново
+        # двумя запросами, а не по запросу на ингредиент.
+        prefetch_related_objects(
+            [instance], 'ingredients_in_recipe__ingredient', 'tags'
+        )
         serializer = RecipeRepresentationSerializer(instance,
                                                     context=self.context)
         return serializer.data
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
+    image = RecipeImageField(variant='thumbnail')
 
     class Meta:
         model = Recipe
@@ -215,18 +467,24 @@ class RecipeShortSerializer(serializers.ModelSerializer):
         read_only_fields = ('__all__',)
 
 
-class UserSubscriptionSerializer(UserSerializer):
+class UserSubscriptionSerializer(CustomUserSerializer):
     recipes_count = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
 
-    class Meta:
-        model = User
-        fields = ('__all__')
+    class Meta(CustomUserSerializer.Meta):
+        fields = CustomUserSerializer.Meta.fields + (
+            'recipes',
+            'recipes_count'
+        )
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'recipes_preview'):
+            return RecipeShortSerializer(obj.recipes_preview, many=True).data
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
         recipes = Recipe.objects.filter(author=obj)
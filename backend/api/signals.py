@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import get_backend, invalidate_tokens
+from api.cache import bump_catalogue_version
+from recipes.models import Ingredient, Tag
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def catalogue_changed(sender, **kwargs):
+    bump_catalogue_version(sender)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, created, **kwargs):
+    # Смена пароля, деактивация и любое другое изменение пользователя.
+    if created or get_backend() is None:
+        return
+    invalidate_tokens(
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    )
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    '''Постоянное соединение, оборванное сервером базы за время простоя,
+    закрывается при первом обращении к нему в запросе, а не роняет
+    запрос (foodgram/db/health.py).'''
+    if not settings.DB_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict['CONN_MAX_AGE'] != 0):
+            connection.health_check_pending = True
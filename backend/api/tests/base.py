@@ -0,0 +1,91 @@
+'''Общие данные тестов API: пользователи, теги, рецепты и временный
+MEDIA_ROOT для их изображений.'''
+import io
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe, Tag
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+
+
+def create_user(username, **fields):
+    return User.objects.create_user(
+        username=username, email=f'{username}@foodgram.ru',
+        password='pass', **fields
+    )
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class FoodgramTestCase(APITestCase):
+    '''Пользователи reader (self.user) и author (self.author);
+    файлы рецептов пишутся во временный MEDIA_ROOT.'''
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = create_user('reader')
+        self.author = create_user('author')
+
+    @staticmethod
+    def add_tags():
+        '''Теги завтрак, обед и ужин.'''
+        return [
+            Tag.objects.create(name=name, color='#E26C2D', slug=slug)
+            for name, slug in (
+                (Tag.TagChoeces.BREAKFAST, 'breakfast'),
+                (Tag.TagChoeces.LUNCH, 'lunch'),
+                (Tag.TagChoeces.DINNER, 'dinner'),
+            )
+        ]
+
+    def add_recipe(self, number=0, author=None, **fields):
+        return Recipe.objects.create(
+            author=author or self.author,
+            name=f'Рецепт {number}',
+            text=f'Описание рецепта {number}',
+            cooking_time=10,
+            **fields
+        )
+
+    @staticmethod
+    def recipe_record(author, number=0):
+        '''Строка JSON Lines для import_recipes.'''
+        return {
+            'author': author,
+            'name': f'Рецепт {number}',
+            'text': f'Описание рецепта {number}',
+            'cooking_time': 5,
+            'tags': [],
+            'ingredients': [],
+        }
+
+    @staticmethod
+    def import_recipes(records):
+        '''Загружает записи командой import_recipes, возвращает
+        её вывод в stderr.'''
+        stderr = io.StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'recipes.jsonl'
+            path.write_text('\n'.join(json.dumps(record)
+                                      for record in records),
+                            encoding='UTF-8')
+            call_command('import_recipes', str(path), stderr=stderr)
+        return stderr.getvalue()
@@ -0,0 +1,33 @@
+'''Проверка команды benchmark_api на небольшом наборе данных.'''
+import io
+
+from django.core.management import call_command
+
+from api.management.commands.benchmark_api import Command
+from api.tests.base import FoodgramTestCase
+from recipes.models import Ingredient
+
+
+class BenchmarkApiTest(FoodgramTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_tags()
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+
+    def deep_page(self):
+        return Command().endpoints(self.user).get('recipes-list-deep-page')
+
+    def test_deep_page_follows_recipe_count(self):
+        self.add_recipe()
+        self.assertIsNone(self.deep_page())
+        for number in range(1, 14):
+            self.add_recipe(number)
+        self.assertEqual(self.deep_page(), '/api/recipes/?page=3')
+
+    def test_small_dataset(self):
+        for number in range(7):
+            self.add_recipe(number)
+        stdout = io.StringIO()
+        call_command('benchmark_api', requests=1, warmup=0, stdout=stdout)
+        self.assertIn('recipes-list-deep-page', stdout.getvalue())
@@ -0,0 +1,90 @@
+'''Проверка постоянных соединений при первом обращении к базе в запросе.'''
+from unittest import mock
+
+from django.core.signals import request_started
+from django.test import SimpleTestCase, override_settings
+
+from foodgram.db.health import HealthCheckMixin
+
+
+class Connection:
+    '''Обёртка соединения без сервера: считает проверки is_usable.'''
+
+    def __init__(self, usable=True, conn_max_age=60):
+        self.connection = object()
+        self.settings_dict = {'CONN_MAX_AGE': conn_max_age}
+        self.in_atomic_block = False
+        self.usable = usable
+        self.checks = 0
+
+    def is_usable(self):
+        self.checks += 1
+        return self.usable
+
+    def close(self):
+        self.connection = None
+
+    def ensure_connection(self):
+        if self.connection is None:
+            self.connection = object()
+
+
+class CheckedConnection(HealthCheckMixin, Connection):
+    pass
+
+
+class HealthCheckTest(SimpleTestCase):
+
+    def start_request(self, *aliases):
+        with mock.patch('api.signals.connections') as connections:
+            connections.all.return_value = aliases
+            request_started.send(sender=self.__class__)
+
+    def test_no_check_without_queries(self):
+        connection = CheckedConnection()
+        self.start_request(connection)
+        self.assertTrue(connection.health_check_pending)
+        self.assertEqual(connection.checks, 0)
+
+    def test_checked_once_on_first_use(self):
+        connection = CheckedConnection()
+        opened = connection.connection
+        self.start_request(connection)
+        connection.ensure_connection()
+        connection.ensure_connection()
+        self.assertEqual(connection.checks, 1)
+        self.assertIs(connection.connection, opened)
+
+    def test_broken_connection_reopened(self):
+        connection = CheckedConnection(usable=False)
+        broken = connection.connection
+        self.start_request(connection)
+        connection.ensure_connection()
+        self.assertEqual(connection.checks, 1)
+        self.assertIsNotNone(connection.connection)
+        self.assertIsNot(connection.connection, broken)
+
+    def test_not_closed_inside_transaction(self):
+        connection = CheckedConnection(usable=False)
+        broken = connection.connection
+        self.start_request(connection)
+        connection.in_atomic_block = True
+        connection.ensure_connection()
+        self.assertEqual(connection.checks, 0)
+        self.assertIs(connection.connection, broken)
+
+    def test_only_open_persistent_connections_marked(self):
+        persistent = CheckedConnection()
+        closed = CheckedConnection()
+        closed.connection = None
+        per_request = CheckedConnection(conn_max_age=0)
+        self.start_request(persistent, closed, per_request)
+        self.assertTrue(persistent.health_check_pending)
+        self.assertFalse(closed.health_check_pending)
+        self.assertFalse(per_request.health_check_pending)
+
+    @override_settings(DB_HEALTH_CHECKS=False)
+    def test_disabled(self):
+        connection = CheckedConnection()
+        self.start_request(connection)
+        self.assertFalse(connection.health_check_pending)
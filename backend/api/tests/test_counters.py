@@ -0,0 +1,116 @@
+'''Проверка денормализованных счётчиков рецептов и авторов.'''
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.core.management.sql import emit_post_migrate_signal
+
+from api.tests.base import FoodgramTestCase, create_user
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import AuthorStats, Subscription
+
+User = get_user_model()
+
+
+class CounterTestCase(FoodgramTestCase):
+
+    def stats(self, user):
+        return AuthorStats.objects.filter(user=user).values_list(
+            'recipes_count', 'subscribers_count'
+        ).first()
+
+
+class RecipeCountersTest(CounterTestCase):
+
+    def counters(self, recipe):
+        return Recipe.objects.filter(pk=recipe.pk).values_list(
+            'favorites_count', 'in_carts_count'
+        ).get()
+
+    def test_favorite_and_cart(self):
+        recipe = self.add_recipe()
+        favorite = Favorite.objects.create(user=self.user, recipe=recipe)
+        Favorite.objects.create(user=self.author, recipe=recipe)
+        cart = ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        self.assertEqual(self.counters(recipe), (2, 1))
+        favorite.delete()
+        cart.delete()
+        self.assertEqual(self.counters(recipe), (1, 0))
+
+    def test_user_deleted(self):
+        recipe = self.add_recipe()
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        self.user.delete()
+        self.assertEqual(self.counters(recipe), (0, 0))
+
+
+class AuthorCountersTest(CounterTestCase):
+
+    def test_recipes(self):
+        first = self.add_recipe(0)
+        self.add_recipe(1)
+        self.assertEqual(self.stats(self.author), (2, 0))
+        first.delete()
+        self.assertEqual(self.stats(self.author), (1, 0))
+
+    def test_subscribers(self):
+        other = create_user('other')
+        subscription = Subscription.objects.create(subscriber=self.user,
+                                                   author=self.author)
+        Subscription.objects.create(subscriber=other, author=self.author)
+        self.assertEqual(self.stats(self.author), (0, 2))
+        subscription.delete()
+        self.assertEqual(self.stats(self.author), (0, 1))
+        other.delete()
+        self.assertEqual(self.stats(self.author), (0, 0))
+
+
+class RebuildCountersTest(CounterTestCase):
+
+    def test_check_and_rebuild(self):
+        recipe = self.add_recipe()
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        Subscription.objects.create(subscriber=self.user, author=self.author)
+        call_command('rebuild_counters', check=True, stdout=io.StringIO())
+
+        Recipe.objects.filter(pk=recipe.pk).update(favorites_count=5)
+        AuthorStats.objects.filter(user=self.author).delete()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', check=True,
+                         stdout=io.StringIO())
+        call_command('rebuild_counters', stdout=io.StringIO())
+        call_command('rebuild_counters', check=True, stdout=io.StringIO())
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).favorites_count, 1
+        )
+        self.assertEqual(self.stats(self.author), (1, 1))
+
+
+class AuthorDeleteTest(CounterTestCase):
+
+    def test_delete_author_with_recipes_and_subscribers(self):
+        self.add_recipe(0)
+        self.add_recipe(1)
+        Subscription.objects.create(subscriber=self.user, author=self.author)
+        Subscription.objects.create(subscriber=self.author, author=self.user)
+        self.author.delete()
+        self.assertFalse(User.objects.filter(username='author').exists())
+        self.assertIsNone(self.stats(self.author))
+        self.assertEqual(self.stats(self.user), (0, 0))
+        self.assertFalse(Recipe.objects.exists())
+
+
+class BackfillTest(CounterTestCase):
+
+    def test_backfill_after_migrate(self):
+        recipe = self.add_recipe()
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        Subscription.objects.create(subscriber=self.user, author=self.author)
+        AuthorStats.objects.all().delete()
+        Recipe.objects.update(favorites_count=0)
+        emit_post_migrate_signal(0, False, 'default')
+        self.assertEqual(self.stats(self.author), (1, 1))
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).favorites_count, 1
+        )
@@ -0,0 +1,71 @@
+'''Проверка ленты подписок: backfill, отписка, fan-out и rebuild_feed.'''
+import io
+
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.test import override_settings
+
+from api.tests.base import FoodgramTestCase
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription
+
+
+@override_settings(FEED_FANOUT_WORKERS=0)
+class FeedTest(FoodgramTestCase):
+
+    def feed(self, user=None):
+        return set(FeedEntry.objects.filter(
+            subscriber=user or self.user
+        ).values_list('recipe_id', flat=True))
+
+    @override_settings(FEED_BACKFILL=2)
+    def test_subscribe_backfill(self):
+        recipes = [self.add_recipe(number) for number in range(3)]
+        Subscription.objects.create(subscriber=self.user, author=self.author)
+        self.assertEqual(self.feed(), {recipes[1].pk, recipes[2].pk})
+
+    def test_unsubscribe_removes_entries(self):
+        self.add_recipe()
+        Subscription.objects.create(subscriber=self.user, author=self.author)
+        Subscription.objects.get(subscriber=self.user).delete()
+        self.assertEqual(self.feed(), set())
+
+    def test_new_recipe_fan_out(self):
+        Subscription.objects.create(subscriber=self.user, author=self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = self.add_recipe()
+        self.assertEqual(self.feed(), {recipe.pk})
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_popular_author_read_time(self):
+        Subscription.objects.create(subscriber=self.user, author=self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = self.add_recipe()
+        self.assertEqual(self.feed(), set())
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(
+            [item['id'] for item in response.json()['results']], [recipe.pk]
+        )
+
+    def test_rebuild_feed(self):
+        recipes = [self.add_recipe(number) for number in range(3)]
+        Subscription.objects.create(subscriber=self.user, author=self.author)
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_feed', batch_size=2, stdout=io.StringIO())
+        self.assertEqual(self.feed(), {recipe.pk for recipe in recipes})
+
+    def test_import_fan_out(self):
+        Subscription.objects.create(subscriber=self.user, author=self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.import_recipes([self.recipe_record(self.author.email)])
+        self.assertEqual(
+            self.feed(), {Recipe.objects.get(name='Рецепт 0').pk}
+        )
+
+    def test_backfill_after_migrate(self):
+        recipe = self.add_recipe()
+        Subscription.objects.create(subscriber=self.user, author=self.author)
+        FeedEntry.objects.all().delete()
+        emit_post_migrate_signal(0, False, 'default')
+        self.assertEqual(self.feed(), {recipe.pk})
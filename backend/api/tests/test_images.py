@@ -0,0 +1,54 @@
+'''Проверка построения и удаления вариантов изображений рецептов.'''
+import io
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import override_settings
+from PIL import Image
+
+from api.tests.base import FoodgramTestCase
+
+
+def png(color):
+    output = io.BytesIO()
+    Image.new('RGB', (400, 300), color).save(output, 'PNG')
+    return ContentFile(output.getvalue(), 'recipe.png')
+
+
+@override_settings(IMAGE_PIPELINE_WORKERS=0)
+class ImageVariantsTest(FoodgramTestCase):
+
+    def create_recipe(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = self.add_recipe(image=image)
+        recipe.refresh_from_db()
+        return recipe
+
+    def variant_files(self, recipe):
+        return [path for variant, path in recipe.image_variants.items()
+                if variant != 'source']
+
+    def test_broken_image_is_logged(self):
+        with self.assertLogs('recipes.images', 'ERROR'):
+            recipe = self.create_recipe(
+                ContentFile(b'not an image', 'recipe.png')
+            )
+        self.assertEqual(recipe.image_variants, {})
+
+    def test_replace_and_delete_remove_variants(self):
+        recipe = self.create_recipe(png('red'))
+        old_files = self.variant_files(recipe)
+        self.assertTrue(old_files)
+        self.assertTrue(all(map(default_storage.exists, old_files)))
+
+        recipe.image.save('recipe.png', png('blue'), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        recipe.refresh_from_db()
+        new_files = self.variant_files(recipe)
+        self.assertTrue(all(map(default_storage.exists, new_files)))
+        self.assertFalse(any(map(default_storage.exists, old_files)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertFalse(any(map(default_storage.exists, new_files)))
@@ -0,0 +1,26 @@
+'''Проверка загрузки рецептов командой import_recipes.'''
+from django.contrib.auth import get_user_model
+
+from api.tests.base import FoodgramTestCase
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class ImportRecipesTest(FoodgramTestCase):
+
+    def test_username_taken_by_another_user(self):
+        User.objects.create_user(username='chef@foodgram.ru',
+                                 email='other@foodgram.ru', password='pass')
+        output = self.import_recipes([
+            self.recipe_record('chef@foodgram.ru', 0),
+            self.recipe_record('cook@foodgram.ru', 1),
+        ])
+        self.assertIn('chef@foodgram.ru', output)
+        self.assertEqual(
+            list(Recipe.objects.values_list('author__email', flat=True)),
+            ['cook@foodgram.ru']
+        )
+        self.assertFalse(User.objects.filter(
+            email='chef@foodgram.ru'
+        ).exists())
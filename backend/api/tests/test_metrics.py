@@ -0,0 +1,45 @@
+'''Проверка доступа к /api/metrics.'''
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+User = get_user_model()
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_ALLOWED_IPS=[])
+class MetricsAccessTest(APITestCase):
+
+    def get(self, user=None):
+        headers = {}
+        if user is not None:
+            token = Token.objects.create(user=user)
+            headers['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+        return self.client.get('/api/metrics', **headers)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.assertEqual(self.get().status_code, 404)
+
+    def test_anonymous(self):
+        self.assertEqual(self.get().status_code, 403)
+
+    def test_user(self):
+        user = User.objects.create_user(
+            username='reader', email='reader@foodgram.ru', password='pass'
+        )
+        self.assertEqual(self.get(user).status_code, 403)
+
+    def test_staff(self):
+        user = User.objects.create_user(
+            username='admin', email='admin@foodgram.ru', password='pass',
+            is_staff=True
+        )
+        response = self.get(user)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE foodgram_request_duration_seconds',
+                      response.content)
+
+    @override_settings(METRICS_ALLOWED_IPS=['127.0.0.0/8'])
+    def test_allowed_address(self):
+        self.assertEqual(self.get().status_code, 200)
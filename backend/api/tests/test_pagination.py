@@ -0,0 +1,79 @@
+'''Проверка курсорной пагинации рецептов при одинаковых значениях
+первого поля сортировки (pub_date, рейтинг популярности).'''
+import base64
+
+from django.utils import timezone
+
+from api.tests.base import FoodgramTestCase
+from recipes.models import Recipe, RecipePopularity
+
+
+class RecipeCursorPaginationTest(FoodgramTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for number in range(15):
+            self.add_recipe(number)
+        # Две группы рецептов с одинаковым pub_date.
+        now = timezone.now()
+        ids = list(Recipe.objects.order_by('pk').values_list('pk', flat=True))
+        Recipe.objects.filter(pk__in=ids[:8]).update(pub_date=now)
+        Recipe.objects.filter(pk__in=ids[8:]).update(
+            pub_date=now - timezone.timedelta(days=1)
+        )
+        self.expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('pk', flat=True))
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            pages.append([item['id'] for item in data['results']])
+            url = data[link]
+        return pages
+
+    def test_no_duplicates_or_gaps(self):
+        for limit in (1, 4, 6, 8):
+            with self.subTest(limit=limit):
+                pages = self.walk(
+                    f'/api/recipes/?pagination=cursor&limit={limit}', 'next'
+                )
+                ids = [pk for page in pages for pk in page]
+                self.assertEqual(ids, self.expected)
+
+    def test_previous_pages(self):
+        url = '/api/recipes/?pagination=cursor&limit=4'
+        while True:
+            data = self.client.get(url).json()
+            if not data['next']:
+                break
+            url = data['next']
+        pages = self.walk(url, 'previous')
+        ids = [pk for page in reversed(pages) for pk in page]
+        self.assertEqual(ids, self.expected)
+
+    def test_popular_equal_scores(self):
+        now = timezone.now()
+        RecipePopularity.objects.bulk_create(
+            RecipePopularity(recipe_id=pk, score=1.0 if index < 6 else 0.5,
+                             updated=now)
+            for index, pk in enumerate(self.expected)
+        )
+        pages = self.walk('/api/recipes/popular/?limit=4', 'next')
+        ids = [pk for page in pages for pk in page]
+        self.assertEqual(ids, sorted(self.expected[:6], reverse=True)
+                         + sorted(self.expected[6:], reverse=True))
+
+    def test_invalid_position(self):
+        for position in ('abc', 'abc|1', '1.0|abc'):
+            with self.subTest(position=position):
+                cursor = base64.b64encode(
+                    f'p={position}'.encode()
+                ).decode()
+                response = self.client.get(
+                    '/api/recipes/popular/', {'cursor': cursor}
+                )
+                self.assertEqual(response.status_code, 404)
@@ -0,0 +1,501 @@
+'''Проверка количества SQL-запросов эндпоинтов API.
+
+Каждый тест наращивает объём данных (число рецептов, ингредиентов,
+подписок, размер страницы) и проверяет, что количество запросов
+к базе не меняется. Если сериализатор начинает делать запросы на
+каждую строку, тест падает и выводит SQL лишних запросов.
+'''
+import io
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api.authentication import local_cache
+from api.cache import state_key
+from api.tests.base import IMAGE, FoodgramTestCase, create_user
+from recipes.models import (Favorite, Ingredient, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.search import ingredient_index
+from users.models import Subscription
+
+User = get_user_model()
+
+SIZES = (1, 5, 20)
+
+
+class QueryCountTestCase(FoodgramTestCase):
+    '''Базовый класс: наполнение базы и сравнение числа запросов.'''
+
+    def setUp(self):
+        cache.clear()
+        super().setUp()
+        self.tags = self.add_tags()
+        self.ingredients = []
+        self.recipes = []
+        self.client.force_authenticate(self.user)
+
+    def add_ingredients(self, count):
+        start = len(self.ingredients)
+        self.ingredients.extend(Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(start, start + count)
+        ))
+        if connection.features.can_return_rows_from_bulk_insert:
+            return
+        self.ingredients = list(Ingredient.objects.order_by('pk'))
+
+    def add_recipes(self, count, author=None, ingredients=3):
+        '''Создаёт рецепты с тегами и ингредиентами, добавляет
+        их текущему пользователю в избранное и список покупок.'''
+        if len(self.ingredients) < ingredients:
+            self.add_ingredients(ingredients - len(self.ingredients))
+        author = author or self.author
+        for _ in range(count):
+            number = len(self.recipes)
+            recipe = self.add_recipe(number, author, image='media/recipe.png')
+            recipe.tags.set(self.tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=number % 999 + 1)
+                for ingredient in self.ingredients[:ingredients]
+            )
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+            self.recipes.append(recipe)
+
+    def add_authors(self, count, recipes=2):
+        '''Создаёт авторов с рецептами и подписывает на них
+        текущего пользователя.'''
+        start = User.objects.count()
+        for i in range(start, start + count):
+            author = create_user(f'author{i}')
+            self.add_recipes(recipes, author=author)
+            Subscription.objects.create(subscriber=self.user, author=author)
+
+    def capture(self, request):
+        with CaptureQueriesContext(connection) as context:
+            response = request()
+            if response.streaming:
+                content = b''.join(response.streaming_content)
+            else:
+                content = response.content
+        return response, content, context.captured_queries
+
+    def assertConstantQueries(self, request, grow, sizes=SIZES):
+        '''Для каждого размера вызывает grow(size), затем request()
+        и сравнивает число запросов с первым (наименьшим) размером.'''
+        baseline = None
+        for size in sizes:
+            grow(size)
+            response, content, queries = self.capture(request)
+            self.assertLess(response.status_code, 400, content)
+            if baseline is None:
+                baseline = (size, queries)
+                continue
+            base_size, base_queries = baseline
+            if len(queries) != len(base_queries):
+                sql = '\n'.join(
+                    f'{number}. {query["sql"]}'
+                    for number, query in enumerate(queries, start=1)
+                )
+                self.fail(
+                    f'Число запросов зависит от объёма данных: '
+                    f'{len(base_queries)} при размере {base_size}, '
+                    f'{len(queries)} при размере {size}.\n{sql}'
+                )
+
+
+class RecipeQueryCountTest(QueryCountTestCase):
+
+    def test_list_page_size(self):
+        self.add_recipes(max(SIZES))
+        state = {}
+        self.assertConstantQueries(
+            lambda: self.client.get(
+                '/api/recipes/', {'limit': state['limit']}
+            ),
+            lambda size: state.update(limit=size)
+        )
+
+    def test_list_cursor_page_size(self):
+        self.add_recipes(max(SIZES))
+        state = {}
+        self.assertConstantQueries(
+            lambda: self.client.get(
+                '/api/recipes/',
+                {'pagination': 'cursor', 'limit': state['limit']}
+            ),
+            lambda size: state.update(limit=size)
+        )
+
+    def test_popular(self):
+        def grow(size):
+            self.add_recipes(size)
+            call_command('update_popularity', stdout=io.StringIO())
+
+        self.assertConstantQueries(
+            lambda: self.client.get('/api/recipes/popular/', {'limit': 100}),
+            grow
+        )
+        response = self.client.get('/api/recipes/popular/',
+                                   {'pagination': 'cursor'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_feed(self):
+        self.assertConstantQueries(
+            lambda: self.client.get('/api/recipes/feed/', {'limit': 100}),
+            lambda size: self.add_authors(size)
+        )
+
+    def test_list_related_rows(self):
+        self.assertConstantQueries(
+            lambda: self.client.get('/api/recipes/', {'limit': 100}),
+            lambda size: self.add_recipes(size, ingredients=size)
+        )
+
+    @override_settings(RECIPE_FAST_SERIALIZER=False)
+    def test_list_related_rows_serializer(self):
+        self.test_list_related_rows()
+
+    def test_fast_serializer_output(self):
+        '''RecipeRowSerializer отдаёт те же байты, что и
+        RecipeRepresentationSerializer.'''
+        self.add_recipes(3, ingredients=4)
+        Subscription.objects.create(subscriber=self.user, author=self.author)
+        for path in ('/api/recipes/', f'/api/recipes/{self.recipes[0].pk}/',
+                     '/api/recipes/feed/'):
+            with override_settings(RECIPE_FAST_SERIALIZER=False):
+                expected = self.client.get(path)
+            self.assertEqual(self.client.get(path).content,
+                             expected.content, path)
+
+    def test_list_anonymous(self):
+        self.client.force_authenticate(None)
+        self.assertConstantQueries(
+            lambda: self.client.get('/api/recipes/', {'limit': 100}),
+            lambda size: self.add_recipes(size, ingredients=size)
+        )
+
+    def test_list_tag_filter(self):
+        self.assertConstantQueries(
+            lambda: self.client.get(
+                '/api/recipes/', {'limit': 100, 'tags': ['lunch', 'dinner']}
+            ),
+            lambda size: self.add_recipes(size)
+        )
+
+    def test_list_user_filters(self):
+        self.assertConstantQueries(
+            lambda: self.client.get('/api/recipes/', {
+                'limit': 100,
+                'is_favorited': 1,
+                'is_in_shopping_cart': 1,
+                'author': self.author.pk,
+            }),
+            lambda size: self.add_recipes(size)
+        )
+
+    @override_settings(RECIPE_TAGS_FILTER='mask')
+    def test_list_tag_mask_filter(self):
+        self.test_list_tag_filter()
+
+    def test_detail(self):
+        state = {}
+
+        def grow(size):
+            self.add_recipes(1, ingredients=size)
+            state['recipe'] = self.recipes[-1]
+
+        self.assertConstantQueries(
+            lambda: self.client.get(f'/api/recipes/{state["recipe"].pk}/'),
+            grow
+        )
+
+    def recipe_payload(self, size):
+        self.add_ingredients(max(0, size - len(self.ingredients)))
+        return {
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 10}
+                for ingredient in self.ingredients[:size]
+            ],
+            'tags': [tag.pk for tag in self.tags[:min(size, 3)]],
+            'image': IMAGE,
+            'name': f'Новый рецепт {size}',
+            'text': f'Новое описание {size}',
+            'cooking_time': 5,
+        }
+
+    def test_create(self):
+        state = {}
+        self.assertConstantQueries(
+            lambda: self.client.post(
+                '/api/recipes/', state['payload'], format='json'
+            ),
+            lambda size: state.update(payload=self.recipe_payload(size))
+        )
+
+    def test_update(self):
+        self.client.force_authenticate(self.author)
+        state = {}
+
+        def grow(size):
+            # При каждом размере одна строка ингредиентов удаляется,
+            # size изменяются и одна добавляется, теги меняются.
+            self.add_recipes(1, ingredients=size + 1)
+            state['recipe'] = self.recipes[-1]
+            payload = self.recipe_payload(size + 2)
+            payload['ingredients'] = [
+                {'id': ingredient.pk, 'amount': 500}
+                for ingredient in self.ingredients[1:size + 2]
+            ]
+            payload['tags'] = [tag.pk for tag in self.tags[:2]]
+            state['payload'] = payload
+
+        self.assertConstantQueries(
+            lambda: self.client.patch(
+                f'/api/recipes/{state["recipe"].pk}/', state['payload'],
+                format='json'
+            ),
+            grow
+        )
+
+    def test_favorite(self):
+        state = {}
+
+        def grow(size):
+            self.add_recipes(size, ingredients=size)
+            state['recipe'] = self.recipes[-1]
+
+        def grow_without(size):
+            grow(size)
+            Favorite.objects.filter(recipe=state['recipe']).delete()
+
+        self.assertConstantQueries(
+            lambda: self.client.post(
+                f'/api/recipes/{state["recipe"].pk}/favorite/'
+            ),
+            grow_without
+        )
+        self.assertConstantQueries(
+            lambda: self.client.delete(
+                f'/api/recipes/{state["recipe"].pk}/favorite/'
+            ),
+            grow
+        )
+
+    def test_shopping_cart(self):
+        state = {}
+
+        def grow(size):
+            self.add_recipes(size, ingredients=size)
+            state['recipe'] = self.recipes[-1]
+
+        def grow_without(size):
+            grow(size)
+            ShoppingCart.objects.filter(recipe=state['recipe']).delete()
+
+        self.assertConstantQueries(
+            lambda: self.client.post(
+                f'/api/recipes/{state["recipe"].pk}/shopping_cart/'
+            ),
+            grow_without
+        )
+        self.assertConstantQueries(
+            lambda: self.client.delete(
+                f'/api/recipes/{state["recipe"].pk}/shopping_cart/'
+            ),
+            grow
+        )
+
+    def test_download_shopping_cart(self):
+        self.assertConstantQueries(
+            lambda: self.client.get('/api/recipes/download_shopping_cart/'),
+            lambda size: self.add_recipes(size, ingredients=size)
+        )
+
+
+class UserQueryCountTest(QueryCountTestCase):
+
+    def test_list(self):
+        self.assertConstantQueries(
+            lambda: self.client.get('/api/users/', {'limit': 100}),
+            lambda size: self.add_authors(size)
+        )
+
+    def test_detail(self):
+        self.assertConstantQueries(
+            lambda: self.client.get(f'/api/users/{self.author.pk}/'),
+            lambda size: self.add_recipes(size)
+        )
+
+    def test_me(self):
+        self.assertConstantQueries(
+            lambda: self.client.get('/api/users/me/'),
+            lambda size: self.add_authors(size)
+        )
+
+    def test_subscriptions(self):
+        self.assertConstantQueries(
+            lambda: self.client.get(
+                '/api/users/subscriptions/',
+                {'limit': 100, 'recipes_limit': 3}
+            ),
+            lambda size: self.add_authors(size, recipes=size)
+        )
+
+    def test_subscribe(self):
+        state = {}
+
+        def grow(size):
+            self.add_authors(size)
+            state['author'] = User.objects.latest('pk')
+
+        def grow_without(size):
+            grow(size)
+            Subscription.objects.filter(author=state['author']).delete()
+
+        self.assertConstantQueries(
+            lambda: self.client.post(
+                f'/api/users/{state["author"].pk}/subscribe/'
+            ),
+            grow_without
+        )
+        self.assertConstantQueries(
+            lambda: self.client.delete(
+                f'/api/users/{state["author"].pk}/subscribe/'
+            ),
+            grow
+        )
+
+
+class CatalogueQueryCountTest(QueryCountTestCase):
+    '''Справочники кэшируются, поэтому перед каждым замером
+    кэш очищается и измеряется запрос без кэша.'''
+
+    def grow_recipes(self, size):
+        self.add_recipes(size)
+        cache.clear()
+
+    def grow_ingredients(self, size):
+        self.add_ingredients(size)
+        ingredient_index.invalidate()
+        cache.clear()
+
+    def test_tags(self):
+        self.assertConstantQueries(
+            lambda: self.client.get('/api/tags/'),
+            self.grow_recipes
+        )
+
+    def test_tag_detail(self):
+        self.assertConstantQueries(
+            lambda: self.client.get(f'/api/tags/{self.tags[0].pk}/'),
+            self.grow_recipes
+        )
+
+    def test_ingredients(self):
+        self.assertConstantQueries(
+            lambda: self.client.get('/api/ingredients/', {'name': 'инг'}),
+            self.grow_ingredients
+        )
+
+    @override_settings(INGREDIENT_SEARCH_INDEX=False)
+    def test_ingredients_without_index(self):
+        self.assertConstantQueries(
+            lambda: self.client.get('/api/ingredients/', {'name': 'инг'}),
+            self.grow_ingredients
+        )
+
+    def test_ingredient_detail(self):
+        self.add_ingredients(1)
+        self.assertConstantQueries(
+            lambda: self.client.get(
+                f'/api/ingredients/{self.ingredients[0].pk}/'
+            ),
+            self.grow_ingredients
+        )
+
+    def test_cached_and_not_modified(self):
+        response = self.client.get('/api/tags/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/tags/').data,
+                             response.data)
+            not_modified = self.client.get(
+                '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        Tag.objects.filter(pk=self.tags[0].pk).delete()
+        self.assertEqual(
+            self.client.get(
+                '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag']
+            ).status_code,
+            200
+        )
+
+    def test_state_expires(self):
+        '''Изменение из другого процесса не сбрасывает локальный кэш,
+        но после истечения состояния выдаётся новая версия.'''
+        response = self.client.get('/api/tags/')
+        cache.delete(state_key(Tag))
+        with mock.patch('api.cache.time.time',
+                        return_value=time.time() + 3600):
+            self.assertEqual(
+                self.client.get(
+                    '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag']
+                ).status_code,
+                200
+            )
+
+
+@override_settings(TOKEN_AUTH_CACHE_ALIAS='local')
+class TokenAuthenticationTest(APITestCase):
+    '''Пользователь по токену берётся из кэша, пока токен
+    не удалён и пользователь не изменён.'''
+
+    def setUp(self):
+        local_cache.clear()
+        self.user = create_user('reader')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached(self):
+        self.client.get('/api/users/me/')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.data['email'], self.user.email)
+        self.assertFalse(
+            any('authtoken_token' in query['sql']
+                for query in queries.captured_queries),
+            'Токен прочитан из базы, а не из кэша.'
+        )
+
+    def test_deactivated(self):
+        self.client.get('/api/users/me/')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_logout(self):
+        self.client.get('/api/users/me/')
+        self.assertEqual(
+            self.client.post('/api/auth/token/logout/').status_code, 204
+        )
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    @override_settings(TOKEN_AUTH_CACHE_ALIAS='default')
+    def test_process_local_cache_not_used(self):
+        '''Кэш default в памяти процесса: токен каждый раз
+        проверяется по базе.'''
+        self.client.get('/api/users/me/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/users/me/')
+        self.assertTrue(any('authtoken_token' in query['sql']
+                            for query in queries.captured_queries))
@@ -0,0 +1,79 @@
+'''Проверка маршрутизации запросов на реплику для чтения.'''
+from unittest import mock
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import SimpleTestCase
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from api.replica import ReplicaReadMixin
+from foodgram.db.routers import (REPLICA_DB_ALIAS, ReplicaRouter,
+                                 replica_reads)
+from recipes.models import Recipe
+
+
+class RouterView(ReplicaReadMixin, APIView):
+    '''Отвечает базой, которую роутер выбрал бы для чтения.'''
+
+    authentication_classes = []
+    permission_classes = []
+
+    def respond(self, request):
+        return Response({'db': ReplicaRouter().db_for_read(Recipe)})
+
+    get = post = delete = respond
+
+
+class ReplicaRouterTest(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(settings.DATABASES, {
+            REPLICA_DB_ALIAS: settings.DATABASES[DEFAULT_DB_ALIAS]
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = ReplicaRouter()
+
+    def test_reads_default_outside_replica_reads(self):
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_reads_replica_inside_replica_reads(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Recipe),
+                             REPLICA_DB_ALIAS)
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_writes_default(self):
+        self.assertEqual(self.router.db_for_write(Recipe), DEFAULT_DB_ALIAS)
+        with replica_reads():
+            self.assertEqual(self.router.db_for_write(Recipe),
+                             DEFAULT_DB_ALIAS)
+
+    def test_reads_default_inside_transaction(self):
+        with replica_reads(), mock.patch.object(
+            connections[DEFAULT_DB_ALIAS], 'in_atomic_block', True
+        ):
+            self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_no_replica_configured(self):
+        del settings.DATABASES[REPLICA_DB_ALIAS]
+        with replica_reads():
+            self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_no_migrations_on_replica(self):
+        self.assertFalse(self.router.allow_migrate(REPLICA_DB_ALIAS,
+                                                   'recipes'))
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS,
+                                                  'recipes'))
+
+    def test_mixin_safe_methods_only(self):
+        factory = APIRequestFactory()
+        view = RouterView.as_view()
+        for method, expected in (('get', REPLICA_DB_ALIAS),
+                                 ('post', None), ('delete', None)):
+            with self.subTest(method=method):
+                response = view(getattr(factory, method)('/'))
+                self.assertEqual(response.data['db'], expected)
+        self.assertIsNone(self.router.db_for_read(Recipe))
@@ -0,0 +1,175 @@
+'''Проверка сводного списка покупок ShoppingListItem.
+
+После каждого изменения корзины и ингредиентов рецептов список
+сравнивается с суммой RecipeIngredient по рецептам корзины —
+прежним способом выгрузки списка покупок.
+'''
+import io
+
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db.models import Sum
+
+from api.tests.base import IMAGE, FoodgramTestCase, create_user
+from recipes.models import Ingredient, RecipeIngredient, ShoppingListItem
+
+
+class ShoppingListTest(FoodgramTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tag = self.add_tags()[1]
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+            for i in range(4)
+        )
+        self.ingredients = list(Ingredient.objects.order_by('pk'))
+
+    def payload(self, amounts, number=0):
+        return {
+            'ingredients': [
+                {'id': self.ingredients[index].pk, 'amount': amount}
+                for index, amount in amounts.items()
+            ],
+            'tags': [self.tag.pk],
+            'image': IMAGE,
+            'name': f'Рецепт {number}',
+            'text': f'Описание рецепта {number}',
+            'cooking_time': 5,
+        }
+
+    def post_recipe(self, amounts, number=0):
+        self.client.force_authenticate(self.author)
+        response = self.client.post('/api/recipes/',
+                                    self.payload(amounts, number),
+                                    format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def edit_recipe(self, recipe_id, amounts, number=0):
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(f'/api/recipes/{recipe_id}/',
+                                     self.payload(amounts, number),
+                                     format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def cart(self, method, recipe_id, user=None):
+        self.client.force_authenticate(user or self.user)
+        getattr(self.client, method)(
+            f'/api/recipes/{recipe_id}/shopping_cart/'
+        )
+
+    def assertListMatches(self, user=None):
+        user = user or self.user
+        expected = dict(RecipeIngredient.objects.filter(
+            recipe__shopping_cart_recipe__user=user
+        ).values('ingredient_id').annotate(total=Sum('amount')).values_list(
+            'ingredient_id', 'total'
+        ).order_by())
+        stored = dict(ShoppingListItem.objects.filter(user=user).values_list(
+            'ingredient_id', 'amount'
+        ))
+        self.assertEqual(stored, expected)
+        return stored
+
+    def test_cart_add_remove(self):
+        first = self.post_recipe({0: 100, 1: 5}, 0)
+        second = self.post_recipe({1: 10, 2: 1}, 1)
+        self.cart('post', first)
+        self.assertEqual(len(self.assertListMatches()), 2)
+        self.cart('post', second)
+        self.assertEqual(
+            self.assertListMatches()[self.ingredients[1].pk], 15
+        )
+        self.cart('delete', first)
+        self.assertListMatches()
+        self.cart('delete', second)
+        self.assertEqual(self.assertListMatches(), {})
+
+    def test_recipe_ingredients_edited(self):
+        first = self.post_recipe({0: 100, 1: 5}, 0)
+        second = self.post_recipe({1: 10}, 1)
+        other = create_user('other')
+        for user in (self.user, other):
+            self.cart('post', first, user)
+            self.cart('post', second, user)
+        self.edit_recipe(first, {1: 7, 3: 2})
+        for user in (self.user, other):
+            stored = self.assertListMatches(user)
+            self.assertNotIn(self.ingredients[0].pk, stored)
+            self.assertEqual(stored[self.ingredients[1].pk], 17)
+        call_command('rebuild_shopping_lists', check=True,
+                     stdout=io.StringIO())
+
+    def test_recipe_deleted(self):
+        first = self.post_recipe({0: 100, 1: 5}, 0)
+        second = self.post_recipe({1: 10}, 1)
+        self.cart('post', first)
+        self.cart('post', second)
+        self.client.force_authenticate(self.author)
+        self.client.delete(f'/api/recipes/{first}/')
+        self.assertEqual(self.assertListMatches(),
+                         {self.ingredients[1].pk: 10})
+
+    def test_rebuild_for_one_user(self):
+        recipe = self.post_recipe({0: 5}, 0)
+        other = create_user('other')
+        self.cart('post', recipe)
+        self.cart('post', recipe, other)
+        call_command('rebuild_shopping_lists', check=True,
+                     users=[self.user.pk], stdout=io.StringIO())
+        ShoppingListItem.objects.filter(user=self.user).delete()
+        call_command('rebuild_shopping_lists', users=[self.user.pk],
+                     stdout=io.StringIO())
+        self.assertEqual(self.assertListMatches(),
+                         {self.ingredients[0].pk: 5})
+        self.assertListMatches(other)
+
+    def test_admin_inline_edit(self):
+        recipe_id = self.post_recipe({0: 100, 1: 5}, 0)
+        self.cart('post', recipe_id)
+        admin = create_user('admin', is_staff=True, is_superuser=True)
+        rows = list(RecipeIngredient.objects.filter(
+            recipe_id=recipe_id
+        ).order_by('ingredient_id'))
+        prefix = 'ingredients_in_recipe'
+        data = {
+            'name': 'Рецепт 0',
+            'text': 'Описание рецепта 0',
+            'cooking_time': 5,
+            'author': self.author.pk,
+            'tags': [self.tag.pk],
+            f'{prefix}-TOTAL_FORMS': 3,
+            f'{prefix}-INITIAL_FORMS': 2,
+            f'{prefix}-MIN_NUM_FORMS': 0,
+            f'{prefix}-MAX_NUM_FORMS': 1000,
+            f'{prefix}-2-recipe': recipe_id,
+            f'{prefix}-2-ingredient': self.ingredients[2].pk,
+            f'{prefix}-2-amount': 3,
+        }
+        for index, row in enumerate(rows):
+            data.update({
+                f'{prefix}-{index}-id': row.pk,
+                f'{prefix}-{index}-recipe': recipe_id,
+                f'{prefix}-{index}-ingredient': row.ingredient_id,
+                f'{prefix}-{index}-amount': 50 if index else row.amount,
+            })
+        data[f'{prefix}-0-DELETE'] = 'on'
+        self.client.force_authenticate(None)
+        self.client.force_login(admin)
+        response = self.client.post(
+            f'/admin/recipes/recipe/{recipe_id}/change/', data
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.assertListMatches(), {
+            self.ingredients[1].pk: 50,
+            self.ingredients[2].pk: 3,
+        })
+
+    def test_backfill_after_migrate(self):
+        recipe = self.post_recipe({0: 5}, 0)
+        self.cart('post', recipe)
+        ShoppingListItem.objects.all().delete()
+        emit_post_migrate_signal(0, False, 'default')
+        self.assertEqual(self.assertListMatches(),
+                         {self.ingredients[0].pk: 5})
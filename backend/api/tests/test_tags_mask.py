@@ -0,0 +1,93 @@
+'''Проверка Recipe.tags_mask и фильтра рецептов по ?tags=.'''
+from django.test import override_settings
+
+from api.tests.base import FoodgramTestCase
+from recipes.models import Recipe, Tag
+
+
+class TagsMaskTest(FoodgramTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.breakfast, self.lunch, self.dinner = self.add_tags()
+        self.recipes = [self.add_recipe(number) for number in range(4)]
+
+    def assertMasksMatchTags(self):
+        for recipe in Recipe.objects.prefetch_related('tags'):
+            expected = 0
+            for tag in recipe.tags.all():
+                expected |= tag.bit
+            self.assertEqual(recipe.tags_mask, expected, recipe.name)
+
+    def test_forward_changes(self):
+        first, second = self.recipes[:2]
+        first.tags.add(self.breakfast, self.dinner)
+        second.tags.set([self.lunch])
+        self.assertMasksMatchTags()
+        first.tags.remove(self.breakfast)
+        self.assertMasksMatchTags()
+        second.tags.set([self.breakfast, self.dinner])
+        self.assertMasksMatchTags()
+        first.tags.clear()
+        self.assertMasksMatchTags()
+        self.assertEqual(Recipe.objects.get(pk=first.pk).tags_mask, 0)
+
+    def test_reverse_changes(self):
+        self.lunch.recipes.add(*self.recipes[:3])
+        self.dinner.recipes.add(self.recipes[0])
+        self.assertMasksMatchTags()
+        self.lunch.recipes.remove(self.recipes[1])
+        self.assertMasksMatchTags()
+        self.lunch.recipes.clear()
+        self.assertMasksMatchTags()
+
+    def test_tag_renamed_and_deleted(self):
+        self.recipes[0].tags.set([self.lunch, self.dinner])
+        self.recipes[1].tags.set([self.lunch, self.breakfast])
+        self.breakfast.delete()
+        self.assertMasksMatchTags()
+        self.lunch.name = Tag.TagChoeces.BREAKFAST
+        self.lunch.save()
+        self.assertMasksMatchTags()
+        self.dinner.delete()
+        self.assertMasksMatchTags()
+
+    def filtered(self, *slugs):
+        response = self.client.get(
+            '/api/recipes/', {'tags': slugs, 'limit': 100}
+        )
+        self.assertEqual(response.status_code, 200)
+        return {item['id'] for item in response.json()['results']}
+
+    def test_filter(self):
+        first, second, third, _ = self.recipes
+        first.tags.set([self.breakfast, self.lunch])
+        second.tags.set([self.lunch])
+        third.tags.set([self.dinner])
+        cases = (
+            (('breakfast',), {first.pk}),
+            (('lunch',), {first.pk, second.pk}),
+            (('breakfast', 'dinner'), {first.pk, third.pk}),
+            (('breakfast', 'lunch', 'dinner'),
+             {first.pk, second.pk, third.pk}),
+        )
+        for mode in ('mask', 'join'):
+            with override_settings(RECIPE_TAGS_FILTER=mode):
+                for slugs, expected in cases:
+                    with self.subTest(mode=mode, tags=slugs):
+                        self.assertEqual(self.filtered(*slugs), expected)
+
+    def test_tag_outside_choices(self):
+        dessert = Tag.objects.create(name='Десерт', color='#E26C2D',
+                                     slug='dessert')
+        first, second = self.recipes[:2]
+        first.tags.set([dessert, self.lunch])
+        second.tags.add(dessert)
+        self.assertEqual(dessert.bit, 0)
+        self.assertMasksMatchTags()
+        for mode in ('mask', 'join'):
+            with override_settings(RECIPE_TAGS_FILTER=mode):
+                with self.subTest(mode=mode):
+                    self.assertEqual(self.filtered('dessert'),
+                                     {first.pk, second.pk})
+                    self.assertEqual(self.filtered('lunch'), {first.pk})
@@ -1,8 +1,10 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api.offload import offload_patterns
 from api.views import (CustomUserViewSet, IngredietViewSet,
-                       RecipeViewSet, TagViewSet)
+                       RecipeViewSet, TagViewSet, metrics)
 
 router = DefaultRouter()
 
@@ -12,7 +14,11 @@ router.register('tags', TagViewSet)
 router.register('ingredients', IngredietViewSet)
 
 urlpatterns = [
+    path('metrics', metrics, name='metrics'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path(r'auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.SERVER_MODE == 'asgi':
+    urlpatterns = offload_patterns(urlpatterns)
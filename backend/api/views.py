@@ -1,32 +1,54 @@
+import ipaddress
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch,
+                              Subquery, Value)
+from django.db.models.functions import Coalesce
+from django.http import (Http404, HttpResponse, HttpResponseForbidden,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from djoser.views import UserViewSet
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from api.authentication import CachedTokenAuthentication
+from api.cache import CatalogueCacheMixin
 from api.filters import RecipeFilter, IngredientFilter
+from api.metrics import CONTENT_TYPE, ExportMeter, MetricsMixin, registry
+from api.pagination import (CursorPaginationMixin, IdCursorPagination,
+                            PopularityCursorPagination,
+                            RecipeCursorPagination)
 from api.permissions import IsAuthorOrReadOnly
-from api.render import TXTShoppingCartRenderer
+from api.render import (CSVShoppingCartRenderer,
+                        JSONLinesShoppingCartRenderer,
+                        TXTShoppingCartRenderer)
+from api.replica import ReplicaReadMixin
 from api.serializers import (CustomUserCreateSerializer, CustomUserSerializer,
-                             DownloadSCSerializer, IngredientSerializer,
+                             IngredientSerializer,
                              RecipeCreateSerializer,
                              RecipeRepresentationSerializer,
+                             RecipeRowSerializer,
                              RecipeShortSerializer, SubscriptionSerializer,
                              TagSerializer, UserSubscriptionSerializer)
-from recipes.models import (Ingredient, Favorite, Recipe,
-                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.models import (Ingredient, Favorite, Recipe, ShoppingCart,
+                            ShoppingListItem, Tag)
+from recipes.feed import feed_queryset
+from recipes.search import ingredient_index
 from users.models import Subscription
 
 
 User = get_user_model()
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(CatalogueCacheMixin, ReadOnlyModelViewSet):
     """Функция представлния тегов (Список всех. Один тег.)"""
 
     queryset = Tag.objects.all()
@@ -34,33 +56,80 @@ class TagViewSet(ReadOnlyModelViewSet):
     pagination_class = None
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(MetricsMixin, ReplicaReadMixin, CursorPaginationMixin,
+                    ModelViewSet):
     """Функция представления рецептов."""
 
     permission_classes = (IsAuthorOrReadOnly,)
+    cursor_pagination_class = RecipeCursorPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
     def get_queryset(self):
-        recipes = Recipe.objects.prefetch_related(
+        recipes = Recipe.objects.select_related('author').prefetch_related(
             'ingredients_in_recipe__ingredient',
             'tags'
-        )
+        ).with_user_flags(self.request.user)
         return recipes
 
-    def get_serializer_class(self):
-        print(self.action)
-        if self.action == 'create' or 'partial_update':
-            print(12)
-            print(self.action)
+    def use_fast_serializer(self):
+        return (settings.RECIPE_FAST_SERIALIZER
+                and self.action in ('list', 'retrieve', 'popular', 'feed'))
 
+    def get_serializer_class(self):
+        if self.action in ('create', 'update', 'partial_update'):
             return RecipeCreateSerializer
-        print(23)
+        if self.use_fast_serializer():
+            return RecipeRowSerializer
         return RecipeRepresentationSerializer
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.use_fast_serializer():
+            return RecipeRowSerializer.rows(queryset)
+        return queryset
+
+    def use_cursor_pagination(self):
+        return self.action == 'feed' or super().use_cursor_pagination()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'popular', 'feed'):
+            context['image_variant'] = 'thumbnail'
+        return context
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(detail=False)
+    def popular(self, request):
+        """Рецепты по убыванию рейтинга популярности. Рейтинг заранее
+        посчитан командой update_popularity в индексированную таблицу;
+        рецепты без добавлений за последнее время не попадают."""
+        self.cursor_pagination_class = PopularityCursorPagination
+        queryset = self.filter_queryset(self.get_queryset()).annotate(
+            popularity_score=F('popularity__score')
+        ).filter(
+            popularity_score__isnull=False
+        ).order_by('-popularity_score', '-id')
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Лента рецептов авторов из подписок, от новых к старым,
+        с курсорной пагинацией."""
+        queryset = feed_queryset(
+            self.filter_queryset(self.get_queryset()), request.user
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(methods=['post', 'delete'], detail=True)
     def favorite(self, request, pk):
         recipe = get_object_or_404(Recipe, pk=pk)
@@ -72,6 +141,8 @@ class RecipeViewSet(ModelViewSet):
             if not created:
                 return Response({"errors": "Рецепт уже в избранных."},
                                 status=status.HTTP_400_BAD_REQUEST)
+            registry.inc('foodgram_mutations_total', kind='favorite',
+                         operation='add')
             serializer = RecipeShortSerializer(recipe,
                                                context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -79,6 +150,8 @@ class RecipeViewSet(ModelViewSet):
         if request.method == 'DELETE':
             get_object_or_404(Favorite, recipe=recipe,
                               user=request.user).delete()
+            registry.inc('foodgram_mutations_total', kind='favorite',
+                         operation='remove')
             return Response({'detail': 'Удален из избранных.'},
                             status=status.HTTP_204_NO_CONTENT)
 
@@ -94,6 +167,8 @@ class RecipeViewSet(ModelViewSet):
             if not created:
                 return Response({"errors": "Рецепт уже в списке."},
                                 status=status.HTTP_400_BAD_REQUEST)
+            registry.inc('foodgram_mutations_total', kind='shopping_cart',
+                         operation='add')
             serializer = RecipeShortSerializer(recipe,
                                                context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -101,36 +176,60 @@ class RecipeViewSet(ModelViewSet):
         if request.method == 'DELETE':
             get_object_or_404(ShoppingCart, user=request.user,
                               recipe=recipe).delete()
+            registry.inc('foodgram_mutations_total', kind='shopping_cart',
+                         operation='remove')
             return Response({'detail': 'Рецепт удален из списка.'},
                             status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=["get"],
-            renderer_classes=[TXTShoppingCartRenderer])
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[TXTShoppingCartRenderer,
+                              CSVShoppingCartRenderer,
+                              JSONLinesShoppingCartRenderer])
     def download_shopping_cart(self, request):
-        queryset = RecipeIngredient.objects.filter(
-            recipe__shopping_cart_recipe__user=request.user).values(
-                'ingredient__name',
-                'ingredient__measurement_unit').annotate(
-                    amount=Sum('amount')).order_by('ingredient__name')
+        """Список покупок потоком: строки сводного списка читаются
+        курсором и сразу пишутся в ответ выбранным (?format=)
+        рендерером."""
+        rows = ShoppingListItem.objects.filter(user=request.user).order_by(
+            'ingredient__name'
+        ).values_list(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'amount'
+        ).iterator(chunk_size=500)
 
+        renderer = request.accepted_renderer
+        meter = ExportMeter(renderer.format)
         now = timezone.now()
         file_name = (f"shopping_cart_{now:%Y-%m-%d_%H-%M-%S}"
-                     f".{request.accepted_renderer.format}")
-        serializer = DownloadSCSerializer(queryset, many=True)
-        return Response(
-            serializer.data,
-            headers={
-                "Content-Disposition": f'attachment; filename="{file_name}"'
-            }
+                     f".{renderer.format}")
+        response = StreamingHttpResponse(
+            meter.stream(renderer.stream(meter.count_rows(rows))),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}"
         )
+        response["Content-Disposition"] = (
+            f'attachment; filename="{file_name}"'
+        )
+        return response
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(MetricsMixin, CursorPaginationMixin, UserViewSet):
     '''Кастомный вьюсет, наследованный от Djoser,
     расширен queryset.'''
 
+    cursor_pagination_class = IdCursorPagination
+
     def get_queryset(self):
-        queryset = User.objects.all()
+        user = self.request.user
+        if user.is_anonymous:
+            return User.objects.annotate(
+                is_subscribed=Value(False, output_field=BooleanField())
+            )
+        queryset = User.objects.annotate(
+            is_subscribed=Exists(Subscription.objects.filter(
+                subscriber=user, author=OuterRef('pk')
+            ))
+        )
         return queryset
 
     def get_serializer_class(self):
@@ -151,18 +250,39 @@ class CustomUserViewSet(UserViewSet):
                 author=author,
                 subscriber=request.user
             )
+            registry.inc('foodgram_mutations_total', kind='subscription',
+                         operation='add')
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
             get_object_or_404(Subscription, author=author,
                               subscriber=request.user).delete()
+            registry.inc('foodgram_mutations_total', kind='subscription',
+                         operation='remove')
             return Response({'detail': 'Отписка.'},
                             status=status.HTTP_204_NO_CONTENT)
 
     @action(methods=['get'], detail=False)
     def subscriptions(self, request):
-
-        authors = User.objects.filter(subscription__subscriber=request.user.id)
+        """Подписки пользователя. Число рецептов считается аннотацией,
+        первые recipes_limit рецептов всех авторов страницы
+        загружаются одним запросом."""
+        recipes = Recipe.objects.all()
+        limit = request.query_params.get('recipes_limit')
+        if limit and limit.isdigit():
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('pk')[:int(limit)]
+            ))
+        authors = User.objects.filter(
+            subscription__subscriber=request.user.id
+        ).annotate(
+            recipes_count=Coalesce('stats__recipes_count', 0),
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='recipes_preview')
+        ).order_by('pk')
         page = self.paginate_queryset(authors)
         if page is not None:
             serializer = UserSubscriptionSerializer(
@@ -176,8 +296,62 @@ class CustomUserViewSet(UserViewSet):
         return Response(serializer.data)
 
 
-class IngredietViewSet(ReadOnlyModelViewSet):
+class IngredietViewSet(ReplicaReadMixin, CatalogueCacheMixin,
+                       ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filterset_class = IngredientFilter
+
+    def get_search_limit(self):
+        limit = self.request.query_params.get('limit', '')
+        if limit.isdigit() and int(limit) > 0:
+            return min(int(limit), settings.INGREDIENT_SEARCH_LIMIT)
+        return settings.INGREDIENT_SEARCH_LIMIT
+
+    def list(self, request, *args, **kwargs):
+        """Поиск по ?name= идёт по индексу в памяти (точные совпадения,
+        затем по началу названия, затем по подстроке); без индекса —
+        фильтр istartswith по функциональному индексу в базе."""
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        if settings.INGREDIENT_SEARCH_INDEX:
+            return Response(
+                ingredient_index.search(name, self.get_search_limit())
+            )
+        queryset = self.filter_queryset(self.get_queryset()).order_by(
+            'name'
+        )[:self.get_search_limit()]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+
+def metrics_allowed(request):
+    """Метрики отдаются адресам из METRICS_ALLOWED_IPS и запросам
+    с токеном администратора (is_staff)."""
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        address = None
+    if address is not None and any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in settings.METRICS_ALLOWED_IPS
+    ):
+        return True
+    try:
+        credentials = CachedTokenAuthentication().authenticate(
+            Request(request)
+        )
+    except AuthenticationFailed:
+        return False
+    return credentials is not None and credentials[0].is_staff
+
+
+def metrics(request):
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,21 @@
+'''Проверка постоянного соединения при первом обращении к базе.
+
+Постоянное соединение (CONN_MAX_AGE != 0) могло оборваться на стороне
+сервера за время простоя. В начале запроса api.signals отмечает такие
+соединения, а SELECT 1 отправляется только при первом курсоре этого
+соединения в запросе, как CONN_HEALTH_CHECKS в Django 4.1: запросы, не
+обращающиеся к базе или к реплике, лишнего обмена не делают.
+'''
+
+
+class HealthCheckMixin:
+
+    health_check_pending = False
+
+    def ensure_connection(self):
+        if self.health_check_pending:
+            self.health_check_pending = False
+            if (self.connection is not None and not self.in_atomic_block
+                    and not self.is_usable()):
+                self.close()
+        super().ensure_connection()
@@ -0,0 +1,87 @@
+'''PostgreSQL с пулом соединений в процессе (DB_POOL).
+
+Соединение берётся из psycopg2.pool.ThreadedConnectionPool и в конце
+запроса возвращается в пул вместо закрытия, поэтому при CONN_MAX_AGE = 0
+запрос не тратит время на установку соединения, а число соединений
+процесса ограничено POOL['MAX'] независимо от числа потоков. Пул свой
+у каждого процесса: после форка соединения родителя не используются.
+Соединение, на котором была ошибка, закрывается, а не возвращается.
+'''
+import os
+import threading
+
+import psycopg2
+import psycopg2.extras
+from django.db.backends.postgresql import base
+from psycopg2.pool import ThreadedConnectionPool
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+
+    def __init__(self, settings_dict, conn_params):
+        options = settings_dict.get('POOL', {})
+        maximum = options.get('MAX', 16)
+        self.timeout = options.get('TIMEOUT', 10)
+        self.pool = ThreadedConnectionPool(
+            min(options.get('SIZE', 4), maximum), maximum, **conn_params
+        )
+        # ThreadedConnectionPool при исчерпании сразу бросает ошибку,
+        # семафор заставляет подождать освобождения соединения.
+        self.slots = threading.BoundedSemaphore(maximum)
+
+    def getconn(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise psycopg2.OperationalError(
+                f'Нет свободных соединений в пуле за {self.timeout} с.'
+            )
+        try:
+            connection = self.pool.getconn()
+            if connection.closed:
+                self.pool.putconn(connection, close=True)
+                connection = self.pool.getconn()
+        except Exception:
+            self.slots.release()
+            raise
+        return connection
+
+    def putconn(self, connection, close=False):
+        try:
+            self.pool.putconn(connection,
+                              close=close or bool(connection.closed))
+        finally:
+            self.slots.release()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_pool(self, conn_params):
+        key = (self.alias, os.getpid())
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ConnectionPool(self.settings_dict, conn_params)
+            return _pools[key]
+
+    @base.async_unsafe
+    def get_new_connection(self, conn_params):
+        connection = self.get_pool(conn_params).getconn()
+        # Как в base.DatabaseWrapper.get_new_connection.
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x
+        )
+        return connection
+
+    def _close(self):
+        pool = _pools[(self.alias, os.getpid())]
+        with self.wrap_database_errors:
+            pool.putconn(self.connection, close=self.errors_occurred)
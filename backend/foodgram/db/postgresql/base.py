@@ -0,0 +1,8 @@
+'''PostgreSQL с проверкой постоянного соединения (foodgram.db.health).'''
+from django.db.backends.postgresql import base
+
+from foodgram.db.health import HealthCheckMixin
+
+
+class DatabaseWrapper(HealthCheckMixin, base.DatabaseWrapper):
+    pass
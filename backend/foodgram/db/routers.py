@@ -0,0 +1,46 @@
+'''Чтение с реплики (DATABASES['replica']).
+
+На реплику идут только запросы на чтение внутри replica_reads(): его
+включают вьюсеты для безопасных методов (api.replica.ReplicaReadMixin).
+Остальное, в том числе все записи и чтение внутри транзакции, идёт
+в default. Реплика может отставать, поэтому чтение сразу после записи
+с неё не гарантирует, что запись уже видна.
+'''
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if (_replica_reads.get()
+                and REPLICA_DB_ALIAS in settings.DATABASES
+                and not connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return REPLICA_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Без явного ответа Django пишет туда, откуда прочитан объект.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_DB_ALIAS
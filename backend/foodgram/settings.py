@@ -30,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -41,6 +42,11 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'foodgram.urls'
 
+# 'wsgi' — синхронные воркеры gunicorn (foodgram.wsgi), 'asgi' — воркеры
+# uvicorn (foodgram.asgi), представления API выполняются в пуле потоков
+# размера ASGI_THREADS (api/offload.py). См. gunicorn.conf.py.
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -59,17 +65,93 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# Соединение с базой держится CONN_MAX_AGE секунд (0 — закрывается после
+# каждого запроса, None — без ограничения). DB_HEALTH_CHECKS проверяет
+# постоянное соединение при первом обращении к нему в запросе
+# (foodgram/db/health.py).
+DB_CONN_MAX_AGE = os.getenv('DB_CONN_MAX_AGE', '60')
+DB_HEALTH_CHECKS = os.getenv('DB_HEALTH_CHECKS', 'True').lower() == 'true'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'foodgram.db.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': (None if DB_CONN_MAX_AGE.lower() == 'none'
+                         else int(DB_CONN_MAX_AGE)),
+    }
+}
+
+# Пул соединений в процессе (foodgram/db/pool): соединение возвращается
+# в пул в конце запроса, свободных держится до SIZE, всего открыто
+# не больше MAX, при исчерпании запрос ждёт TIMEOUT секунд.
+if os.getenv('DB_POOL', 'False').lower() == 'true':
+    DATABASES['default'].update({
+        'ENGINE': 'foodgram.db.pool',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'SIZE': int(os.getenv('DB_POOL_SIZE', 4)),
+            'MAX': int(os.getenv('DB_POOL_MAX', 16)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        },
+    })
+
+# Реплика для чтения: безопасные запросы вьюсетов с ReplicaReadMixin
+# (api/replica.py) читают с неё, см. foodgram/db/routers.py.
+if os.getenv('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DB_REPLICA_HOST'),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+if os.getenv('USE_SQLITE', 'False').lower() == 'true':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+    # Для проверки маршрутизации: «реплика» — тот же файл.
+    if os.getenv('DB_REPLICA', 'False').lower() == 'true':
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'TEST': {'MIRROR': 'default'},
+        }
+
+DATABASE_ROUTERS = ['foodgram.db.routers.ReplicaRouter']
+
+# По умолчанию кэш в памяти процесса. Для общего кэша между
+# воркерами укажите CACHE_BACKEND и CACHE_LOCATION, например
+# django_redis.cache.RedisCache и redis://redis:6379/1.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
     }
 }
 
+# Ответы справочников и их версия живут CATALOGUE_CACHE_TIMEOUT секунд:
+# с кэшем в памяти процесса изменения из другого процесса видны не
+# позже, чем через это время (api/cache.py).
+CATALOGUE_CACHE_ALIAS = 'default'
+CATALOGUE_CACHE_TIMEOUT = int(os.getenv('CATALOGUE_CACHE_TIMEOUT', 300))
+
+# Кэш token -> пользователь (api/authentication.py). Работает, только
+# если кэш алиаса общий (например, Redis в CACHE_BACKEND): с кэшем
+# в памяти процесса отозванный токен действовал бы в других воркерах
+# до TOKEN_AUTH_CACHE_TIMEOUT секунд. 'local' — явно кэш в памяти
+# процесса (один воркер), пустое значение или TIMEOUT = 0 — без кэша.
+TOKEN_AUTH_CACHE_ALIAS = os.getenv('TOKEN_AUTH_CACHE_ALIAS', 'default')
+TOKEN_AUTH_CACHE_TIMEOUT = int(os.getenv('TOKEN_AUTH_CACHE_TIMEOUT', 60))
+TOKEN_AUTH_CACHE_SIZE = 10000
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -109,11 +191,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.render.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.PageLimitNumberPagination',
     'PAGE_SIZE': 6,
 }
@@ -133,3 +219,81 @@ DJOSER = {
         'set_password': ['djoser.permissions.CurrentUserOrAdmin'],
     }
 }
+
+INGREDIENT_SEARCH_INDEX = (
+    os.getenv('INGREDIENT_SEARCH_INDEX', 'True').lower() == 'true'
+)
+INGREDIENT_SEARCH_TTL = int(os.getenv('INGREDIENT_SEARCH_TTL', 300))
+INGREDIENT_SEARCH_LIMIT = 50
+
+# 'join' — фильтр по тегам через таблицу связи, 'mask' — по
+# Recipe.tags_mask (перед включением: manage.py rebuild_tags_mask).
+RECIPE_TAGS_FILTER = os.getenv('RECIPE_TAGS_FILTER', 'join')
+
+# Список, рейтинг, лента и просмотр рецептов через RecipeRowSerializer:
+# словари из строк values() вместо вложенных сериализаторов DRF.
+RECIPE_FAST_SERIALIZER = (
+    os.getenv('RECIPE_FAST_SERIALIZER', 'True').lower() == 'true'
+)
+
+# Уменьшенные копии изображений рецептов: имя -> (ширина, высота).
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (360, 360),
+    'medium': (960, 960),
+}
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', 2))
+
+# Рейтинг популярности рецептов (команда update_popularity): вес
+# добавления уменьшается вдвое за POPULARITY_HALF_LIFE_DAYS дней,
+# добавления старше POPULARITY_WINDOW_DAYS не учитываются.
+POPULARITY_HALF_LIFE_DAYS = float(os.getenv('POPULARITY_HALF_LIFE_DAYS', 7))
+POPULARITY_WINDOW_DAYS = int(os.getenv('POPULARITY_WINDOW_DAYS', 60))
+POPULARITY_FAVORITE_WEIGHT = 1.0
+POPULARITY_CART_WEIGHT = 2.0
+
+# Лента подписок (recipes/feed.py): рецепты авторов, у которых больше
+# FEED_FANOUT_LIMIT подписчиков, добавляются в ленту при чтении.
+# Раскладка новых рецептов идёт в FEED_FANOUT_WORKERS потоках.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_FANOUT_WORKERS = int(os.getenv('FEED_FANOUT_WORKERS', 1))
+FEED_BACKFILL = 50
+
+# Профилирование запросов (api/profiling.py): Server-Timing, JSON-лог
+# foodgram.profiling и профили cProfile медленных запросов.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() == 'true'
+PROFILING_SERVER_TIMING = True
+# Доля запросов под cProfile; профиль пишется, если запрос дольше
+# PROFILING_SLOW_MS. Пустой PROFILING_DIR отключает cProfile.
+PROFILING_DIR = os.getenv('PROFILING_DIR', '')
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0.1))
+PROFILING_SLOW_MS = int(os.getenv('PROFILING_SLOW_MS', 500))
+
+# Метрики в формате Prometheus на /api/metrics (api/metrics.py). При
+# нескольких воркерах gunicorn METRICS_DIR — общий каталог для снимков
+# процессов, его нужно очищать при развёртывании. Эндпоинт доступен
+# адресам (сетям) из METRICS_ALLOWED_IPS и по токену администратора.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False').lower() == 'true'
+METRICS_ALLOWED_IPS = [
+    network.strip() for network
+    in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+    if network.strip()
+]
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 1))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'foodgram.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag)
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -17,6 +17,20 @@ class TagAdmin(admin.ModelAdmin):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientInline, )
+    list_display = ('name', 'author', 'favorites_count', 'in_carts_count')
+    readonly_fields = ('favorites_count', 'in_carts_count', 'tags_mask')
+
+    def save_related(self, request, form, formsets, change):
+        '''Переносит изменения ингредиентов из инлайна в сводные
+        списки покупок пользователей, у которых рецепт в корзине.'''
+        old_amounts = (
+            ShoppingListItem.objects.recipe_amounts(form.instance.pk)
+            if change else {}
+        )
+        super().save_related(request, form, formsets, change)
+        if change:
+            ShoppingListItem.objects.recipe_changed(form.instance,
+                                                    old_amounts)
 
 
 @admin.register(Ingredient)
@@ -0,0 +1,95 @@
+'''Лента рецептов авторов, на которых подписан пользователь.
+
+Новый рецепт после коммита раскладывается в FeedEntry подписчиков
+автора пачками по FEED_FANOUT_BATCH_SIZE строк (fan-out on write)
+в пуле потоков, чтобы не задерживать ответ; при FEED_FANOUT_WORKERS = 0
+— сразу, в том же потоке. Ошибка раскладки только пишется в лог.
+Рецепты авторов, у которых больше FEED_FANOUT_LIMIT подписчиков, не
+раскладываются — они добавляются в ленту при чтении (fan-out on read).
+При подписке в ленту попадают последние FEED_BACKFILL рецептов автора,
+при отписке его рецепты из ленты удаляются. Команда rebuild_feed
+строит ленты заново.
+'''
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+
+from recipes.models import FeedEntry, Recipe
+from recipes.tasks import run_after_commit
+from users.models import AuthorStats, Subscription
+
+
+def is_popular(author_id):
+    '''Рецепты автора раздаются при чтении, а не при записи.'''
+    return AuthorStats.objects.filter(
+        user_id=author_id,
+        subscribers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).exists()
+
+
+def fan_out(recipe_id, author_id):
+    '''Добавляет рецепт в ленты всех подписчиков автора.'''
+    subscribers = Subscription.objects.filter(
+        author_id=author_id
+    ).values_list('subscriber_id', flat=True).order_by().iterator(
+        chunk_size=settings.FEED_FANOUT_BATCH_SIZE
+    )
+    while True:
+        batch = list(islice(subscribers, settings.FEED_FANOUT_BATCH_SIZE))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(subscriber_id=subscriber_id, recipe_id=recipe_id,
+                       author_id=author_id)
+             for subscriber_id in batch],
+            ignore_conflicts=True
+        )
+
+
+def schedule_fan_out(recipes):
+    '''Ставит раскладку рецептов в ленты в очередь после коммита.'''
+    popular = set(AuthorStats.objects.filter(
+        user_id__in={recipe.author_id for recipe in recipes},
+        subscribers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).values_list('user_id', flat=True))
+    for recipe in recipes:
+        if recipe.author_id not in popular:
+            run_after_commit('recipe-feed', settings.FEED_FANOUT_WORKERS,
+                             fan_out, recipe.pk, recipe.author_id)
+
+
+def backfill(subscriber_id, author_id):
+    '''Последние рецепты автора в ленту нового подписчика.'''
+    if is_popular(author_id):
+        return
+    recipe_ids = Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('pk', flat=True)[:settings.FEED_BACKFILL]
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(subscriber_id=subscriber_id, recipe_id=recipe_id,
+                   author_id=author_id)
+         for recipe_id in recipe_ids],
+        ignore_conflicts=True
+    )
+
+
+def remove(subscriber_id, author_id):
+    FeedEntry.objects.filter(
+        subscriber_id=subscriber_id, author_id=author_id
+    ).delete()
+
+
+def feed_queryset(recipes, user):
+    '''Рецепты ленты user из выборки recipes: разложенные записи
+    и рецепты популярных авторов из подписок.'''
+    popular_authors = Subscription.objects.filter(
+        subscriber=user,
+        author__stats__subscribers_count__gt=settings.FEED_FANOUT_LIMIT
+    ).values('author_id')
+    return recipes.filter(
+        Q(pk__in=FeedEntry.objects.filter(subscriber=user).values(
+            'recipe_id'
+        ))
+        | Q(author__in=popular_authors)
+    )
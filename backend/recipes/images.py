@@ -0,0 +1,95 @@
+'''Уменьшенные копии изображений рецептов.
+
+После сохранения рецепта с новым изображением его варианты
+(RECIPE_IMAGE_VARIANTS: имя -> максимальные ширина и высота)
+перекодируются в WebP в пуле потоков, чтобы не задерживать ответ.
+При IMAGE_PIPELINE_WORKERS = 0 варианты строятся сразу, в том же
+потоке. Пути готовых вариантов записываются в Recipe.image_variants.
+Ошибка построения только пишется в лог: рецепт уже сохранён. Файлы
+вариантов прежнего изображения удаляются после замены изображения
+и после удаления рецепта.
+'''
+import io
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image
+
+from recipes.models import Recipe
+from recipes.tasks import run_after_commit
+
+logger = logging.getLogger(__name__)
+
+
+def variant_path(name, variant):
+    stem, _ = posixpath.splitext(name)
+    return f'{stem}_{variant}.webp'
+
+
+def encode_variant(image, size):
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    output = io.BytesIO()
+    variant.save(output, 'WEBP', quality=settings.IMAGE_VARIANT_QUALITY)
+    return output.getvalue()
+
+
+def delete_variants(storage, variants, keep=()):
+    '''Удаляет файлы вариантов из словаря image_variants.'''
+    for variant, path in variants.items():
+        if variant == 'source' or not path or path in keep:
+            continue
+        try:
+            storage.delete(path)
+        except OSError:
+            logger.exception('Не удалось удалить вариант изображения %s',
+                             path)
+
+
+def build_variants(recipe_id, name):
+    '''Строит варианты изображения name рецепта recipe_id.'''
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'image_variants'
+    ).first()
+    if recipe is None or recipe.image.name != name:
+        return
+    old_variants = recipe.image_variants or {}
+    storage = recipe.image.storage
+    with storage.open(name, 'rb') as file:
+        image = Image.open(file)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    variants = {'source': name}
+    for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        path = variant_path(name, variant)
+        if storage.exists(path):
+            storage.delete(path)
+        variants[variant] = storage.save(
+            path, ContentFile(encode_variant(image, size))
+        )
+    Recipe.objects.filter(pk=recipe_id, image=name).update(
+        image_variants=variants
+    )
+    if old_variants.get('source') != name:
+        delete_variants(storage, old_variants, keep=variants.values())
+
+
+def schedule_variants(recipe):
+    '''Ставит построение вариантов в очередь после коммита.'''
+    if not recipe.image:
+        return
+    run_after_commit('recipe-images', settings.IMAGE_PIPELINE_WORKERS,
+                     build_variants, recipe.pk, recipe.image.name)
+
+
+def schedule_variants_cleanup(recipe):
+    '''Удаляет файлы вариантов удалённого рецепта после коммита.'''
+    variants = dict(recipe.image_variants or {})
+    if not variants:
+        return
+    storage = Recipe._meta.get_field('image').storage
+    transaction.on_commit(lambda: delete_variants(storage, variants))
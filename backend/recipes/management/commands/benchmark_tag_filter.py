@@ -0,0 +1,116 @@
+import random
+import statistics
+import time
+from itertools import combinations
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe, Tag
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает фильтр рецептов по тегам через таблицу связи '
+            'и через Recipe.tags_mask. Синтетические рецепты создаются '
+            'в транзакции, которая в конце откатывается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=100_000,
+            help='Сколько синтетических рецептов добавить (0 — только '
+                 'существующие данные).'
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def seed(self, count, tags, batch_size):
+        author = User.objects.create_user(
+            username='tag-benchmark', email='tag-benchmark@foodgram.local'
+        )
+        for start in range(0, count, batch_size):
+            Recipe.objects.bulk_create(
+                Recipe(author=author, name=f'Рецепт {number}',
+                       text=f'tag-benchmark {number}', cooking_time=10,
+                       image='media/benchmark.png')
+                for number in range(start, min(start + batch_size, count))
+            )
+        through = Recipe.tags.through
+        recipe_ids = Recipe.objects.filter(author=author).values_list(
+            'pk', flat=True
+        ).iterator(chunk_size=batch_size)
+        links, masks = [], {}
+        for recipe_id in recipe_ids:
+            for tag in random.sample(tags, random.randint(1, len(tags))):
+                links.append(through(recipe_id=recipe_id, tag_id=tag.pk))
+                masks[recipe_id] = masks.get(recipe_id, 0) | tag.bit
+            if len(links) >= batch_size:
+                through.objects.bulk_create(links)
+                links = []
+        through.objects.bulk_create(links)
+        for mask in set(masks.values()):
+            ids = [pk for pk, value in masks.items() if value == mask]
+            for start in range(0, len(ids), batch_size):
+                Recipe.objects.filter(
+                    pk__in=ids[start:start + batch_size]
+                ).update(tags_mask=mask)
+
+    def measure(self, queryset, repeat):
+        page = queryset.order_by('-pub_date', '-id').values_list(
+            'pk', flat=True
+        )
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            count = queryset.count()
+            list(page[:6])
+            list(page[count // 2:count // 2 + 6])
+            timings.append(time.perf_counter() - started)
+        return count, statistics.median(timings) * 1000
+
+    def run(self, options):
+        tags = list(Tag.objects.all())
+        if not tags:
+            tags = [
+                Tag.objects.create(name=name, color='#000000',
+                                   slug=f'benchmark-{number}')
+                for number, name in enumerate(Tag.TagChoeces.values)
+            ]
+        if options['recipes']:
+            self.stdout.write(f'Создаём {options["recipes"]} рецептов…')
+            self.seed(options['recipes'], tags, options['batch_size'])
+        total = Recipe.objects.count()
+        self.stdout.write(
+            f'Рецептов: {total}, повторов: {options["repeat"]}\n'
+            f'{"теги":<30}{"найдено":>10}{"join, мс":>12}{"mask, мс":>12}'
+        )
+        for size in range(1, len(tags) + 1):
+            for selected in combinations(tags, size):
+                join = Recipe.objects.filter(tags__in=selected).distinct()
+                mask = Recipe.objects.filter(tags_mask__in=Tag.masks_matching(
+                    sum(tag.bit for tag in selected)
+                ))
+                join_count, join_ms = self.measure(join, options['repeat'])
+                mask_count, mask_ms = self.measure(mask, options['repeat'])
+                slugs = ','.join(tag.slug for tag in selected)
+                warning = '' if join_count == mask_count else '  (!)'
+                self.stdout.write(
+                    f'{slugs:<30}{join_count:>10}'
+                    f'{join_ms:>12.2f}{mask_ms:>12.2f}{warning}'
+                )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
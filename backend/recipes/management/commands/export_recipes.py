@@ -0,0 +1,112 @@
+import base64
+import json
+import sys
+import time
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe, RecipeIngredient
+
+
+class Command(BaseCommand):
+    help = ('Выгружает рецепты в JSON Lines: по строке на рецепт '
+            'с автором, тегами, ингредиентами и изображением.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл или '-' для stdout.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--after-id',
+            type=int,
+            default=0,
+            help='Продолжить выгрузку с рецептов с id больше указанного.'
+        )
+        parser.add_argument(
+            '--embed-images',
+            action='store_true',
+            help='Включить содержимое изображений в base64.'
+        )
+
+    def batches(self, after_id, batch_size):
+        '''Рецепты пачками по возрастанию id, связанные строки
+        каждой пачки читаются двумя запросами.'''
+        through = Recipe.tags.through
+        while True:
+            recipes = list(
+                Recipe.objects.filter(pk__gt=after_id).order_by('pk').values(
+                    'pk', 'name', 'text', 'cooking_time', 'pub_date',
+                    'image', 'author__email'
+                )[:batch_size]
+            )
+            if not recipes:
+                return
+            ids = [recipe['pk'] for recipe in recipes]
+            tags = defaultdict(list)
+            for recipe_id, slug in through.objects.filter(
+                recipe_id__in=ids
+            ).values_list('recipe_id', 'tag__slug'):
+                tags[recipe_id].append(slug)
+            ingredients = defaultdict(list)
+            rows = RecipeIngredient.objects.filter(
+                recipe_id__in=ids
+            ).order_by('pk').values_list(
+                'recipe_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount'
+            )
+            for recipe_id, name, unit, amount in rows:
+                ingredients[recipe_id].append({
+                    'name': name, 'measurement_unit': unit, 'amount': amount
+                })
+            for recipe in recipes:
+                recipe['tags'] = tags[recipe['pk']]
+                recipe['ingredients'] = ingredients[recipe['pk']]
+            yield recipes
+            after_id = ids[-1]
+
+    def serialize(self, recipe, embed_images):
+        image = {'name': recipe['image']}
+        if embed_images and recipe['image']:
+            with default_storage.open(recipe['image'], 'rb') as file:
+                image['data'] = base64.b64encode(file.read()).decode()
+        return json.dumps({
+            'id': recipe['pk'],
+            'author': recipe['author__email'],
+            'name': recipe['name'],
+            'text': recipe['text'],
+            'cooking_time': recipe['cooking_time'],
+            'pub_date': recipe['pub_date'].isoformat(),
+            'tags': recipe['tags'],
+            'ingredients': recipe['ingredients'],
+            'image': image,
+        }, ensure_ascii=False) + '\n'
+
+    def handle(self, *args, **options):
+        output = (sys.stdout if options['path'] == '-'
+                  else open(options['path'], 'w', encoding='UTF-8'))
+        count = 0
+        last_id = options['after_id']
+        started = time.monotonic()
+        try:
+            for recipes in self.batches(last_id, options['batch_size']):
+                output.writelines(
+                    self.serialize(recipe, options['embed_images'])
+                    for recipe in recipes
+                )
+                count += len(recipes)
+                last_id = recipes[-1]['pk']
+                if options['verbosity'] > 1:
+                    self.stderr.write(
+                        f'{count} рецептов (до id {last_id}), '
+                        f'{count / (time.monotonic() - started):.0f} в секунду'
+                    )
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        elapsed = time.monotonic() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено {count} рецептов за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-6):.0f} в секунду), '
+            f'последний id {last_id}.'
+        ))
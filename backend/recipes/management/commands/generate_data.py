@@ -0,0 +1,175 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, call_command
+from django.db import transaction
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+TAG_COLORS = ('#E26C2D', '#49B64E', '#8775D2')
+
+
+class Command(BaseCommand):
+    help = ('Генерирует синтетические данные: пользователей, подписки, '
+            'рецепты, избранное и списки покупок. Ингредиенты берутся '
+            'из data/ingredients.csv.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument(
+            '--recipes', type=int, default=10,
+            help='Рецептов на пользователя в среднем.'
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=8,
+            help='Ингредиентов в рецепте в среднем.'
+        )
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Подписок на пользователя в среднем.'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Рецептов в избранном на пользователя в среднем.'
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Рецептов в списке покупок на пользователя в среднем.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def around(self, mean):
+        '''Случайное число с заданным средним: у одних пользователей
+        много рецептов и подписчиков, у других мало.'''
+        if mean <= 0:
+            return 0
+        return min(int(random.expovariate(1 / mean)) + 1, mean * 10)
+
+    def ensure_catalogue(self):
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', verbosity=0)
+        for number, name in enumerate(Tag.TagChoeces.values):
+            if not Tag.objects.filter(name=name).exists():
+                Tag.objects.create(
+                    name=name, color=TAG_COLORS[number % len(TAG_COLORS)],
+                    slug=Tag.TagChoeces(name).name.lower()
+                )
+
+    def create_users(self, prefix, count):
+        password = make_password('password')
+        User.objects.bulk_create(
+            (User(username=f'{prefix}{number}',
+                  email=f'{prefix}{number}@foodgram.local',
+                  first_name='Имя', last_name=f'Фамилия {number}',
+                  password=password)
+             for number in range(count)),
+            batch_size=self.batch_size
+        )
+        return list(User.objects.filter(
+            username__startswith=prefix
+        ).values_list('pk', flat=True))
+
+    def create_recipes(self, prefix, user_ids, options):
+        tags = list(Tag.objects.all())
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        recipes, number = [], 0
+        for user_id in user_ids:
+            for _ in range(self.around(options['recipes'])):
+                recipe_tags = random.sample(tags, random.randint(1, len(tags)))
+                recipes.append(Recipe(
+                    author_id=user_id,
+                    name=f'Рецепт {number}',
+                    text=f'{prefix} рецепт {number}',
+                    cooking_time=random.randint(5, 180),
+                    image='media/generated.png',
+                    tags_mask=sum(tag.bit for tag in recipe_tags)
+                ))
+                recipes[-1].generated_tags = recipe_tags
+                number += 1
+        Recipe.objects.bulk_create(recipes, batch_size=self.batch_size)
+        ids = dict(Recipe.objects.filter(
+            text__startswith=f'{prefix} '
+        ).values_list('text', 'pk'))
+
+        through = Recipe.tags.through
+        through.objects.bulk_create(
+            (through(recipe_id=ids[recipe.text], tag_id=tag.pk)
+             for recipe in recipes for tag in recipe.generated_tags),
+            batch_size=self.batch_size
+        )
+        RecipeIngredient.objects.bulk_create(
+            (RecipeIngredient(recipe_id=ids[recipe.text],
+                              ingredient_id=ingredient_id,
+                              amount=random.randint(1, 999))
+             for recipe in recipes
+             for ingredient_id in random.sample(
+                 ingredient_ids,
+                 min(self.around(options['ingredients']),
+                     len(ingredient_ids))
+             )),
+            batch_size=self.batch_size
+        )
+        return list(ids.values())
+
+    def create_links(self, model, user_ids, targets, mean, fields):
+        '''Случайные связи пользователь -> цель (рецепт или автор),
+        популярные цели выбираются чаще.'''
+        user_field, target_field = fields
+        weights = [1 / (rank + 1) for rank in range(len(targets))]
+        links = set()
+        for user_id in user_ids:
+            count = min(self.around(mean), len(targets))
+            for target in random.choices(targets, weights, k=count):
+                if target != user_id or model is not Subscription:
+                    links.add((user_id, target))
+        model.objects.bulk_create(
+            (model(**{user_field: user_id, target_field: target})
+             for user_id, target in links),
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
+        return len(links)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+        prefix = f'gen{options["seed"]}-{int(time.time())}-'
+
+        self.ensure_catalogue()
+        user_ids = self.create_users(prefix, options['users'])
+        recipe_ids = self.create_recipes(prefix, user_ids, options)
+        random.shuffle(recipe_ids)
+        authors = random.sample(user_ids, len(user_ids))
+        subscriptions = self.create_links(
+            Subscription, user_ids, authors, options['subscriptions'],
+            ('subscriber_id', 'author_id')
+        )
+        favorites = self.create_links(
+            Favorite, user_ids, recipe_ids, options['favorites'],
+            ('user_id', 'recipe_id')
+        )
+        carts = self.create_links(
+            ShoppingCart, user_ids, recipe_ids, options['carts'],
+            ('user_id', 'recipe_id')
+        )
+        # bulk_create не вызывает сигналы: сводные списки покупок,
+        # счётчики и ленты пересчитываются отдельно.
+        call_command('rebuild_shopping_lists', verbosity=0)
+        call_command('rebuild_counters', verbosity=0)
+        call_command('rebuild_feed', verbosity=0)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано за {time.monotonic() - started:.1f} с: '
+            f'пользователей {len(user_ids)}, рецептов {len(recipe_ids)}, '
+            f'подписок {subscriptions}, избранного {favorites}, '
+            f'в списках покупок {carts}. Пароль пользователей: password.'
+        ))
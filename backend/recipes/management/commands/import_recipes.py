@@ -0,0 +1,232 @@
+import base64
+import json
+import posixpath
+import time
+from collections import Counter
+from itertools import islice
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from recipes.feed import schedule_fan_out
+from recipes.images import schedule_variants
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import AuthorStats
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты из JSON Lines (формат export_recipes). '
+            'Каждая пачка строк — отдельная транзакция; номер последней '
+            'загруженной строки пишется в файл состояния, и повторный '
+            'запуск продолжает с него. Рецепты с уже существующим '
+            'текстом пропускаются, как и рецепты новых авторов, чьё '
+            'имя пользователя занято другим пользователем.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--state-file',
+            type=Path,
+            help='Файл с номером последней загруженной строки '
+                 '(по умолчанию <path>.state).'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Игнорировать файл состояния и читать с начала.'
+        )
+
+    def read_state(self, path, restart):
+        if restart or not path.exists():
+            return 0
+        return int(path.read_text().strip() or 0)
+
+    def resolve_authors(self, emails):
+        '''email -> pk авторов; недостающие создаются. Если username
+        нового автора занят пользователем с другим email, автор в
+        результат не попадает.'''
+        authors = dict(
+            User.objects.filter(email__in=emails).values_list('email', 'pk')
+        )
+        missing = [email for email in emails if email not in authors]
+        if missing:
+            User.objects.bulk_create(
+                (User(email=email, username=email[:150], password='!')
+                 for email in missing),
+                ignore_conflicts=True
+            )
+            authors.update(
+                User.objects.filter(email__in=missing).values_list(
+                    'email', 'pk'
+                )
+            )
+        return authors
+
+    def resolve_ingredients(self, keys):
+        names = {name for name, _ in keys}
+        found = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.filter(name__in=names).values_list(
+                'pk', 'name', 'measurement_unit'
+            )
+        }
+        missing = [key for key in keys if key not in found]
+        if missing:
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in missing),
+                ignore_conflicts=True
+            )
+            found.update(
+                ((name, unit), pk) for pk, name, unit in
+                Ingredient.objects.filter(
+                    name__in={name for name, _ in missing}
+                ).values_list('pk', 'name', 'measurement_unit')
+            )
+        return found
+
+    def save_image(self, image):
+        if not image.get('data'):
+            return image.get('name', '')
+        name = posixpath.join(
+            'media', posixpath.basename(image.get('name') or 'recipe.png')
+        )
+        return default_storage.save(
+            name, ContentFile(base64.b64decode(image['data']))
+        )
+
+    @transaction.atomic
+    def load_chunk(self, records):
+        '''Загружает пачку рецептов: по одному bulk_create на рецепты,
+        теги и ингредиенты. Возвращает число добавленных рецептов.'''
+        existing = set(Recipe.objects.filter(
+            text__in=[record['text'] for record in records]
+        ).values_list('text', flat=True))
+        unique = {}
+        for record in records:
+            if record['text'] not in existing:
+                unique.setdefault(record['text'], record)
+        records = list(unique.values())
+        if not records:
+            return 0
+
+        authors = self.resolve_authors(
+            list({record['author'] for record in records})
+        )
+        conflicts = Counter(record['author'] for record in records
+                            if record['author'] not in authors)
+        for email, count in conflicts.items():
+            self.stderr.write(self.style.WARNING(
+                f'Пропущено рецептов: {count}. Имя пользователя для '
+                f'{email} уже занято другим пользователем.'
+            ))
+        records = [record for record in records
+                   if record['author'] in authors]
+        if not records:
+            return 0
+        ingredients = self.resolve_ingredients(list({
+            (item['name'], item['measurement_unit'])
+            for record in records for item in record['ingredients']
+        }))
+        recipes = []
+        for record in records:
+            mask = 0
+            for slug in record['tags']:
+                if slug in self.tags:
+                    mask |= self.tags[slug].bit
+            recipes.append(Recipe(
+                author_id=authors[record['author']],
+                name=record['name'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=self.save_image(record.get('image', {})),
+                tags_mask=mask
+            ))
+        Recipe.objects.bulk_create(recipes)
+        AuthorStats.objects.add(
+            'recipes_count', Counter(recipe.author_id for recipe in recipes)
+        )
+        ids = dict(Recipe.objects.filter(
+            text__in=[record['text'] for record in records]
+        ).values_list('text', 'pk'))
+
+        dated = []
+        for recipe, record in zip(recipes, records):
+            recipe.pk = ids[record['text']]
+            if record.get('pub_date'):
+                recipe.pub_date = parse_datetime(record['pub_date'])
+                dated.append(recipe)
+        if dated:
+            # auto_now_add перезаписывает pub_date при вставке.
+            Recipe.objects.bulk_update(dated, ['pub_date'])
+
+        through = Recipe.tags.through
+        through.objects.bulk_create(
+            through(recipe_id=recipe.pk, tag_id=self.tags[slug].pk)
+            for recipe, record in zip(recipes, records)
+            for slug in set(record['tags']) if slug in self.tags
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=recipe.pk,
+                ingredient_id=ingredients[
+                    (item['name'], item['measurement_unit'])
+                ],
+                amount=item['amount']
+            )
+            for recipe, record in zip(recipes, records)
+            for item in record['ingredients']
+        )
+        for recipe in recipes:
+            schedule_variants(recipe)
+        schedule_fan_out(recipes)
+        return len(recipes)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        state_file = options['state_file'] or path.with_name(
+            path.name + '.state'
+        )
+        line_number = self.read_state(state_file, options['restart'])
+        self.tags = {tag.slug: tag for tag in Tag.objects.all()}
+
+        created = 0
+        started = time.monotonic()
+        with open(path, 'r', encoding='UTF-8') as file:
+            lines = islice(file, line_number, None)
+            if line_number:
+                self.stderr.write(f'Продолжаем со строки {line_number + 1}.')
+            while True:
+                chunk = list(islice(lines, options['batch_size']))
+                if not chunk:
+                    break
+                try:
+                    records = [json.loads(line) for line in chunk
+                               if line.strip()]
+                except ValueError as error:
+                    raise CommandError(
+                        f'Ошибка в строках {line_number + 1}-'
+                        f'{line_number + len(chunk)}: {error}'
+                    )
+                created += self.load_chunk(records)
+                line_number += len(chunk)
+                state_file.write_text(str(line_number))
+                if options['verbosity'] > 1:
+                    self.stderr.write(
+                        f'{line_number} строк, добавлено {created}, '
+                        f'{created / (time.monotonic() - started):.0f} '
+                        f'рецептов в секунду'
+                    )
+        elapsed = time.monotonic() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Добавлено {created} рецептов за {elapsed:.1f} с '
+            f'({created / max(elapsed, 1e-6):.0f} в секунду).'
+        ))
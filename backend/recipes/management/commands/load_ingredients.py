@@ -1,24 +1,182 @@
-from csv import DictReader
+import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
 from recipes.models import Ingredient
 
+from api.cache import bump_catalogue_version
 from foodgram.settings import BASE_DIR
 
+READ_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.DictReader(file):
+        yield row['name'], row['measurement_unit']
+
+
+def read_json(file):
+    '''Читает JSON-массив объектов по частям, не загружая файл целиком.'''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    while True:
+        chunk = file.read(READ_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался JSON-массив.')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if not chunk:
+                    raise CommandError('Файл JSON обрывается.')
+                break
+            position = end
+            yield item['name'], item['measurement_unit']
+        if not chunk:
+            return
+
+
+READERS = {'csv': read_csv, 'json': read_json}
+
+
+class RowsFile:
+    '''Файлоподобный объект для COPY: отдаёт строки в формате CSV.'''
+
+    def __init__(self, rows):
+        self.chunks = self.write_chunks(rows)
+        self.buffer = ''
+        self.count = 0
+
+    def write_chunks(self, rows):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        for row in rows:
+            writer.writerow(row)
+            self.count += 1
+            if output.tell() >= READ_SIZE:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        yield output.getvalue()
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.buffer += chunk
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
 
 class Command(BaseCommand):
+    help = ('Загружает ингредиенты из CSV или JSON. Уже существующие '
+            '(name, measurement_unit) пропускаются, поэтому команду '
+            'можно запускать повторно.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=BASE_DIR / 'data/ingredients.csv',
+            type=Path
+        )
+        parser.add_argument('--format', choices=READERS.keys())
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--copy',
+            action='store_true',
+            help='Загрузка через COPY (только PostgreSQL).'
+        )
+
+    def clean_rows(self, rows):
+        for name, measurement_unit in rows:
+            name, measurement_unit = name.strip(), measurement_unit.strip()
+            if name and measurement_unit:
+                yield name, measurement_unit
+
+    def load_batches(self, rows, batch_size):
+        count = 0
+        started = time.monotonic()
+        while True:
+            batch = [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in islice(rows, batch_size)
+            ]
+            if not batch:
+                return count
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+            count += len(batch)
+            if self.verbosity > 1:
+                self.stdout.write(
+                    f'{count} строк, '
+                    f'{count / (time.monotonic() - started):.0f} строк/с'
+                )
+
+    def load_copy(self, rows):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        source = RowsFile(rows)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            cursor.cursor.copy_expert(
+                'COPY ingredient_import (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                source
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_import '
+                'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+        return source.count
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        path = options['path']
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат {file_format!r}, укажите --format.'
+            )
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy поддерживается только в PostgreSQL.')
 
-    def handle(self, *args, **kwargs):
-        with open(
-            BASE_DIR / 'data/ingredients.csv',
-            'r',
-            encoding='UTF-8'
-        ) as file:
-            reader = DictReader(file)
-            ingredients = []
-            for row in reader:
-                ingredients.append(Ingredient(
-                    name=row['name'],
-                    measurement_unit=row['measurement_unit']
-                ))
-        Ingredient.objects.bulk_create(ingredients)
+        before = Ingredient.objects.count()
+        started = time.monotonic()
+        with open(path, 'r', encoding='UTF-8', newline='') as file:
+            rows = self.clean_rows(READERS[file_format](file))
+            if options['copy']:
+                count = self.load_copy(rows)
+            else:
+                count = self.load_batches(rows, options['batch_size'])
+        elapsed = time.monotonic() - started
+        created = Ingredient.objects.count() - before
+        bump_catalogue_version(Ingredient)
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {count} строк, добавлено {created} ингредиентов '
+            f'за {elapsed:.1f} с ({count / max(elapsed, 1e-6):.0f} строк/с).'
+        ))
@@ -0,0 +1,106 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import AuthorStats, Subscription
+
+User = get_user_model()
+
+
+def live_count(model, field):
+    '''Подзапрос: число строк model, ссылающихся на объект полем field.'''
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики рецептов (в избранном, в корзинах) '
+            'и авторов (рецептов, подписчиков) или проверяет их (--check).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить с живым расчётом, ничего не менять.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def recipe_mismatches(self):
+        return Recipe.objects.annotate(
+            live_favorites=live_count(Favorite, 'recipe'),
+            live_carts=live_count(ShoppingCart, 'recipe')
+        ).exclude(
+            favorites_count=F('live_favorites'),
+            in_carts_count=F('live_carts')
+        ).values_list(
+            'pk', 'favorites_count', 'live_favorites',
+            'in_carts_count', 'live_carts'
+        )
+
+    def author_mismatches(self):
+        return User.objects.annotate(
+            stored_recipes=Coalesce('stats__recipes_count', 0),
+            stored_subscribers=Coalesce('stats__subscribers_count', 0),
+            live_recipes=live_count(Recipe, 'author'),
+            live_subscribers=live_count(Subscription, 'author')
+        ).exclude(
+            stored_recipes=F('live_recipes'),
+            stored_subscribers=F('live_subscribers')
+        ).values_list(
+            'pk', 'stored_recipes', 'live_recipes',
+            'stored_subscribers', 'live_subscribers'
+        )
+
+    def check_counters(self):
+        recipes = list(self.recipe_mismatches())
+        authors = list(self.author_mismatches())
+        for pk, favorites, live_favorites, carts, live_carts in recipes[:50]:
+            self.stdout.write(
+                f'recipe={pk}: в избранном {favorites} '
+                f'(ожидалось {live_favorites}), в корзинах {carts} '
+                f'(ожидалось {live_carts})'
+            )
+        for pk, recipes_count, live_recipes, subscribers, live_subscribers \
+                in authors[:50]:
+            self.stdout.write(
+                f'user={pk}: рецептов {recipes_count} '
+                f'(ожидалось {live_recipes}), подписчиков {subscribers} '
+                f'(ожидалось {live_subscribers})'
+            )
+        if recipes or authors:
+            raise CommandError(
+                f'Расхождений: рецептов {len(recipes)}, '
+                f'авторов {len(authors)}.'
+            )
+        self.stdout.write(self.style.SUCCESS('Счётчики совпадают.'))
+
+    def handle(self, *args, **options):
+        if options['check']:
+            self.check_counters()
+            return
+
+        with transaction.atomic():
+            recipes = Recipe.objects.update(
+                favorites_count=live_count(Favorite, 'recipe'),
+                in_carts_count=live_count(ShoppingCart, 'recipe')
+            )
+            AuthorStats.objects.bulk_create(
+                (AuthorStats(user_id=pk) for pk in User.objects.filter(
+                    stats__isnull=True
+                ).values_list('pk', flat=True).iterator()),
+                batch_size=options['batch_size'],
+                ignore_conflicts=True
+            )
+            authors = AuthorStats.objects.update(
+                recipes_count=live_count(Recipe, 'author'),
+                subscribers_count=live_count(Subscription, 'author')
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны: рецептов {recipes}, авторов {authors}.'
+        ))
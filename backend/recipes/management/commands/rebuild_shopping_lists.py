@@ -0,0 +1,96 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import RecipeIngredient, ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает сводные списки покупок по корзинам '
+            'или проверяет их (--check).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить с живым расчётом, ничего не менять.'
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='id пользователя (можно указать несколько раз).'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def live_totals(self, users):
+        # Условия в одном filter(): второй filter() по связи
+        # многие-ко-многим добавил бы ещё одно соединение с корзинами
+        # и умножил суммы на число корзин с рецептом.
+        conditions = {'recipe__shopping_cart_recipe__isnull': False}
+        if users:
+            conditions['recipe__shopping_cart_recipe__user__in'] = users
+        rows = RecipeIngredient.objects.filter(**conditions)
+        return {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in rows.values(
+                'recipe__shopping_cart_recipe__user', 'ingredient'
+            ).annotate(total=Sum('amount')).values_list(
+                'recipe__shopping_cart_recipe__user', 'ingredient', 'total'
+            ).order_by().iterator()
+        }
+
+    def stored_totals(self, users):
+        items = ShoppingListItem.objects.all()
+        if users:
+            items = items.filter(user__in=users)
+        return {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in items.values_list(
+                'user', 'ingredient', 'amount'
+            ).iterator()
+        }
+
+    def handle(self, *args, **options):
+        users = options['users']
+        live = self.live_totals(users)
+
+        if options['check']:
+            stored = self.stored_totals(users)
+            mismatches = sorted(
+                key for key in live.keys() | stored.keys()
+                if live.get(key) != stored.get(key)
+            )
+            for user_id, ingredient_id in mismatches[:50]:
+                self.stdout.write(
+                    f'user={user_id} ingredient={ingredient_id}: '
+                    f'ожидалось {live.get((user_id, ingredient_id), 0)}, '
+                    f'в списке {stored.get((user_id, ingredient_id), 0)}'
+                )
+            if mismatches:
+                raise CommandError(
+                    f'Расхождений: {len(mismatches)} из {len(live)} строк.'
+                )
+            self.stdout.write(self.style.SUCCESS(
+                f'Списки покупок совпадают ({len(live)} строк).'
+            ))
+            return
+
+        with transaction.atomic():
+            items = ShoppingListItem.objects.all()
+            if users:
+                items = items.filter(user__in=users)
+            items.delete()
+            ShoppingListItem.objects.bulk_create(
+                (
+                    ShoppingListItem(user_id=user_id,
+                                     ingredient_id=ingredient_id,
+                                     amount=total)
+                    for (user_id, ingredient_id), total in live.items()
+                ),
+                batch_size=options['batch_size']
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересчитаны ({len(live)} строк).'
+        ))
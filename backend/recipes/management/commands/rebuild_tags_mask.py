@@ -0,0 +1,27 @@
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает Recipe.tags_mask по тегам рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        updated = 0
+        last_id = 0
+        while True:
+            ids = list(
+                Recipe.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            updated += Recipe.objects.filter(pk__in=ids).update_tags_mask()
+            last_id = ids[-1]
+        self.stdout.write(self.style.SUCCESS(
+            f'tags_mask пересчитан у {updated} рецептов.'
+        ))
@@ -1,7 +1,14 @@
+from collections import defaultdict
+
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import (BooleanField, Case, Exists, F, OuterRef, Sum,
+                              Value, When)
+from django.db.models.functions import Greatest
 from django.contrib.auth import get_user_model
 
+from users.models import Subscription
+
 User = get_user_model()
 
 
@@ -27,6 +34,78 @@ class Tag(models.Model):
         db_index=True
     )
 
+    @classmethod
+    def bit_for(cls, name):
+        '''Бит тега в Recipe.tags_mask по его месту в TagChoeces.
+        choices в базе не проверяются: у тега с другим названием
+        бита нет (0), фильтр по нему идёт через соединение.'''
+        if name not in cls.TagChoeces.values:
+            return 0
+        return 1 << list(cls.TagChoeces.values).index(name)
+
+    @classmethod
+    def masks_matching(cls, mask):
+        '''Все значения tags_mask, в которых есть хотя бы один
+        бит из mask. Тегов мало, поэтому таких значений немного,
+        и фильтр tags_mask IN (...) идёт по индексу.'''
+        return [
+            value for value in range(1, 1 << len(cls.TagChoeces.values))
+            if value & mask
+        ]
+
+    @property
+    def bit(self):
+        return self.bit_for(self.name)
+
+
+class RecipeQuerySet(models.QuerySet):
+    '''Выборка рецептов с флагами текущего пользователя.'''
+
+    def update_tags_mask(self):
+        '''Пересчитывает tags_mask выбранных рецептов по их тегам.'''
+        masks = defaultdict(int)
+        through = Recipe.tags.through.objects.filter(recipe__in=self)
+        for recipe_id, name in through.values_list(
+            'recipe_id', 'tag__name'
+        ).iterator():
+            masks[recipe_id] |= Tag.bit_for(name)
+        recipes_by_mask = defaultdict(list)
+        for recipe_id, mask in masks.items():
+            recipes_by_mask[mask].append(recipe_id)
+        return self.update(tags_mask=Case(
+            *(When(pk__in=recipe_ids, then=Value(mask))
+              for mask, recipe_ids in recipes_by_mask.items()),
+            default=Value(0),
+            output_field=models.PositiveSmallIntegerField()
+        ))
+
+    def change_counter(self, field, delta):
+        '''Атомарно меняет счётчик field на delta, не ниже нуля.'''
+        return self.update(**{field: Greatest(F(field) + delta, Value(0))})
+
+    def with_user_flags(self, user):
+        '''Добавляет is_favorited, is_in_shopping_cart и
+        author_is_subscribed подзапросами EXISTS вместо
+        отдельного запроса на каждый рецепт.'''
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                author_is_subscribed=false
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            author_is_subscribed=Exists(Subscription.objects.filter(
+                subscriber=user, author=OuterRef('author')
+            ))
+        )
+
 
 class Recipe(models.Model):
     '''Модель рецептов.'''
@@ -51,6 +130,12 @@ class Recipe(models.Model):
     image = models.ImageField(
         upload_to='media/',
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text='Пути уменьшенных копий изображения (recipes.images).'
+    )
     text = models.TextField(unique=True)
     cooking_time = models.PositiveSmallIntegerField(
         validators=(
@@ -59,9 +144,29 @@ class Recipe(models.Model):
         )
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    tags_mask = models.PositiveSmallIntegerField(
+        default=0,
+        db_index=True,
+        help_text='Теги рецепта битами Tag.bit, для фильтра по тегам.'
+    )
+    # Поддерживаются сигналами, пересчитываются rebuild_counters.
+    favorites_count = models.PositiveIntegerField(default=0, editable=False)
+    in_carts_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date', )
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -117,6 +222,7 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         related_name='favorite_user'
     )
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         constraints = [
@@ -138,6 +244,7 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         related_name='shopping_cart_user'
     )
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         constraints = [
@@ -146,3 +253,149 @@ class ShoppingCart(models.Model):
                 name='unique_user_recipe_shop',
             ),
         ]
+
+
+class ShoppingListManager(models.Manager):
+    '''Инкрементальное обновление сводного списка покупок.'''
+
+    @staticmethod
+    def recipe_amounts(recipe_id):
+        '''Количество каждого ингредиента в рецепте.'''
+        return dict(
+            RecipeIngredient.objects.filter(recipe_id=recipe_id).values(
+                'ingredient_id'
+            ).annotate(total=Sum('amount')).values_list(
+                'ingredient_id', 'total'
+            ).order_by()
+        )
+
+    def add_amounts(self, user_ids, amounts):
+        '''Прибавляет amounts ({ingredient_id: количество}, возможно
+        отрицательное) к спискам покупок пользователей user_ids.'''
+        amounts = {key: value for key, value in amounts.items() if value}
+        user_ids = list(user_ids)
+        if not user_ids or not amounts:
+            return
+        self.bulk_create(
+            [
+                self.model(user_id=user_id, ingredient_id=ingredient_id,
+                           amount=0)
+                for user_id in user_ids
+                for ingredient_id, amount in amounts.items()
+                if amount > 0
+            ],
+            ignore_conflicts=True
+        )
+        items = self.filter(user_id__in=user_ids,
+                            ingredient_id__in=amounts.keys())
+        items.update(amount=F('amount') + Case(
+            *(When(ingredient_id=ingredient_id, then=Value(amount))
+              for ingredient_id, amount in amounts.items()),
+            default=Value(0),
+            output_field=models.IntegerField()
+        ))
+        if any(amount < 0 for amount in amounts.values()):
+            items.filter(amount__lte=0).delete()
+
+    def recipe_changed(self, recipe, old_amounts, new_amounts=None):
+        '''Переносит замену ингредиентов рецепта в списки покупок
+        всех пользователей, у которых рецепт в корзине.'''
+        if new_amounts is None:
+            new_amounts = self.recipe_amounts(recipe.pk)
+        delta = {
+            ingredient_id: (new_amounts.get(ingredient_id, 0)
+                            - old_amounts.get(ingredient_id, 0))
+            for ingredient_id in new_amounts.keys() | old_amounts.keys()
+        }
+        self.add_amounts(
+            ShoppingCart.objects.filter(recipe=recipe).values_list(
+                'user_id', flat=True
+            ),
+            delta
+        )
+
+
+class ShoppingListItem(models.Model):
+    '''Сводный список покупок пользователя: сумма ингредиентов
+    всех рецептов из корзины. Поддерживается при изменении корзины
+    и рецептов, пересчитывается командой rebuild_shopping_lists.'''
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items'
+    )
+    amount = models.IntegerField()
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient_shopping_list',
+            ),
+        ]
+
+
+class RecipePopularity(models.Model):
+    '''Рейтинг популярности рецепта: сумма добавлений в избранное
+    и в корзину, затухающая с их давностью. Пересчитывается
+    по расписанию командой update_popularity.'''
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='popularity'
+    )
+    score = models.FloatField()
+    updated = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-score', '-recipe'],
+                name='recipe_popularity_score_idx'
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    '''Рецепт в ленте подписчика (recipes.feed). Автор хранится,
+    чтобы при отписке удалить его рецепты одним запросом.'''
+
+    subscriber = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['subscriber', 'recipe'],
+                name='unique_subscriber_recipe_feed',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['subscriber', 'author'],
+                name='feed_subscriber_author_idx'
+            ),
+        ]
@@ -0,0 +1,119 @@
+'''Поиск ингредиентов для автодополнения.
+
+Справочник ингредиентов небольшой и меняется редко, поэтому он
+целиком держится в памяти процесса отсортированным по нормализованному
+названию. Префиксный поиск — бинарный поиск по этому списку, поиск по
+подстроке — проход по нему же. Индекс строится при первом запросе,
+сбрасывается сигналами при изменении ингредиентов в этом процессе и
+перестраивается по истечении INGREDIENT_SEARCH_TTL секунд (изменения,
+сделанные в других процессах).
+
+Без индекса в памяти (INGREDIENT_SEARCH_INDEX = False) поиск идёт
+фильтром istartswith, для него после migrate создаётся индекс по
+UPPER(name), см. create_prefix_index.
+'''
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+
+from recipes.models import Ingredient
+
+
+def normalize(value):
+    '''Регистронезависимая форма строки, «ё» приравнивается к «е».'''
+    return ' '.join(value.casefold().replace('ё', 'е').split())
+
+
+class IngredientIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None
+        self._rows = None
+        self._built_at = 0.0
+
+    def invalidate(self):
+        with self._lock:
+            self._keys = None
+            self._rows = None
+
+    def _load(self):
+        ttl = getattr(settings, 'INGREDIENT_SEARCH_TTL', 300)
+        with self._lock:
+            if (self._keys is None
+                    or time.monotonic() - self._built_at > ttl):
+                entries = sorted(
+                    (normalize(name), pk, name, measurement_unit)
+                    for pk, name, measurement_unit in
+                    Ingredient.objects.values_list(
+                        'id', 'name', 'measurement_unit'
+                    ).order_by().iterator()
+                )
+                self._keys = [entry[0] for entry in entries]
+                self._rows = [
+                    {'id': pk, 'name': name,
+                     'measurement_unit': measurement_unit}
+                    for _, pk, name, measurement_unit in entries
+                ]
+                self._built_at = time.monotonic()
+            return self._keys, self._rows
+
+    def search(self, query, limit=None):
+        '''Ингредиенты, найденные по query: сначала точные совпадения,
+        затем начинающиеся с query, затем содержащие query.'''
+        query = normalize(query)
+        if not query:
+            return []
+        if limit is None:
+            limit = getattr(settings, 'INGREDIENT_SEARCH_LIMIT', 50)
+        keys, rows = self._load()
+
+        start = position = bisect_left(keys, query)
+        exact, prefix = [], []
+        while position < len(keys) and keys[position].startswith(query):
+            if keys[position] == query:
+                exact.append(position)
+            else:
+                prefix.append(position)
+            position += 1
+        found = exact + prefix
+        if len(found) < limit:
+            substring = sorted(
+                (key.find(query), number)
+                for number, key in enumerate(keys)
+                if not start <= number < position and query in key
+            )
+            found.extend(number for _, number in substring)
+        return [rows[number] for number in found[:limit]]
+
+
+ingredient_index = IngredientIndex()
+
+
+PREFIX_INDEX_NAME = 'ingredient_name_upper_idx'
+
+
+def create_prefix_index(using):
+    '''Создаёт функциональный индекс для istartswith, если его нет.
+
+    Только для PostgreSQL: istartswith там — UPPER(name) LIKE 'ABC%',
+    а класс операторов text_pattern_ops нужен, чтобы LIKE использовал
+    индекс при локали базы, отличной от C. В SQLite LIKE и так
+    регистронезависимый и такой индекс не использует. Индекс
+    не описан в Meta модели: Django 3.2 не умеет задавать класс
+    операторов функциональному индексу без django.contrib.postgres,
+    а в SQLite строит для него недопустимое выражение.'''
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS {quote(PREFIX_INDEX_NAME)} '
+            f'ON {quote(Ingredient._meta.db_table)} '
+            f'(UPPER({quote(Ingredient._meta.get_field("name").column)}) '
+            f'text_pattern_ops)'
+        )
@@ -0,0 +1,127 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete,
+                                      post_migrate, post_save, pre_delete)
+from django.dispatch import receiver
+
+from recipes.feed import schedule_fan_out
+from recipes.images import schedule_variants, schedule_variants_cleanup
+from recipes.models import (Favorite, FeedEntry, Ingredient, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag)
+from recipes.search import create_prefix_index, ingredient_index
+from users.models import AuthorStats, Subscription
+
+User = get_user_model()
+
+# Счётчик рецепта для каждой модели связи пользователь — рецепт.
+RECIPE_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    if created:
+        ShoppingListItem.objects.add_amounts(
+            [instance.user_id],
+            ShoppingListItem.objects.recipe_amounts(instance.recipe_id)
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_removed(sender, instance, **kwargs):
+    amounts = ShoppingListItem.objects.recipe_amounts(instance.recipe_id)
+    ShoppingListItem.objects.add_amounts(
+        [instance.user_id],
+        {ingredient_id: -amount for ingredient_id, amount in amounts.items()}
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def recipe_link_added(sender, instance, created, **kwargs):
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).change_counter(
+            RECIPE_COUNTERS[sender], 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def recipe_link_removed(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).change_counter(
+        RECIPE_COUNTERS[sender], -1
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+def backfill(command, source, target, using, **kwargs):
+    '''Заполняет пустую денормализованную таблицу target командой
+    command, если в source уже есть данные: так при первой миграции
+    существующей базы списки, счётчики и ленты не остаются пустыми.'''
+    if (using == DEFAULT_DB_ALIAS and source.objects.exists()
+            and not target.objects.exists()):
+        call_command(command, verbosity=kwargs.get('verbosity', 1),
+                     stdout=kwargs.get('stdout'))
+
+
+@receiver(post_migrate)
+def recipes_migrated(sender, using, **kwargs):
+    if sender.name != 'recipes':
+        return
+    create_prefix_index(using)
+    backfill('rebuild_shopping_lists', ShoppingCart, ShoppingListItem,
+             using, **kwargs)
+    backfill('rebuild_counters', User, AuthorStats, using, **kwargs)
+    backfill('rebuild_feed', Subscription, FeedEntry, using, **kwargs)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        Recipe.objects.filter(pk=instance.pk).update_tags_mask()
+    elif pk_set:
+        Recipe.objects.filter(pk__in=pk_set).update_tags_mask()
+    else:
+        Recipe.objects.filter(
+            tags_mask__in=Tag.masks_matching(instance.bit)
+        ).update_tags_mask()
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(tags=instance).update_tags_mask()
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    Recipe.objects.filter(
+        tags_mask__in=Tag.masks_matching(instance.bit)
+    ).update(tags_mask=F('tags_mask') - instance.bit)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.add('recipes_count', {instance.author_id: 1})
+        schedule_fan_out([instance])
+    if (instance.image
+            and instance.image_variants.get('source') != instance.image.name):
+        schedule_variants(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    AuthorStats.objects.add('recipes_count', {instance.author_id: -1})
+    schedule_variants_cleanup(instance)
@@ -0,0 +1,54 @@
+'''Фоновая работа после коммита транзакции.
+
+run_after_commit запускает функцию после коммита в именованном пуле
+потоков, чтобы не задерживать ответ, или сразу в том же потоке, если
+потоков 0. Исключение только пишется в лог модуля функции: данные,
+из-за которых она запущена, уже сохранены.
+'''
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_executor(name, workers):
+    with _lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix=name
+            )
+        return _executors[name]
+
+
+def run_logged(function, *args):
+    try:
+        function(*args)
+    except Exception:
+        logging.getLogger(function.__module__).exception(
+            'Ошибка в %s%r', function.__name__, args
+        )
+
+
+def run_in_worker(function, *args):
+    try:
+        run_logged(function, *args)
+    finally:
+        # Соединения потока пула не закрываются обработчиком запроса.
+        connections.close_all()
+
+
+def run_after_commit(pool, workers, function, *args):
+    '''function(*args) после коммита: в пуле pool из workers потоков
+    или, при workers = 0, в текущем потоке.'''
+    if workers > 0:
+        transaction.on_commit(
+            lambda: get_executor(pool, workers).submit(
+                run_in_worker, function, *args
+            )
+        )
+    else:
+        transaction.on_commit(lambda: run_logged(function, *args))
@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
 
-from users.models import Subscription
+from users.models import AuthorStats, Subscription
 
 User = get_user_model()
 
@@ -16,3 +16,9 @@ class CustomUserAdmin(UserAdmin):
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('id', 'author', 'subscriber')
     list_filter = ('author', 'subscriber')
+
+
+@admin.register(AuthorStats)
+class AuthorStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'recipes_count', 'subscribers_count')
+    readonly_fields = ('recipes_count', 'subscribers_count')
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -22,3 +24,52 @@ class Subscription(models.Model):
             models.UniqueConstraint(
                 fields=['subscriber', 'author'],
                 name='unique_subscriber_author')]
+
+
+class AuthorStatsManager(models.Manager):
+    '''Атомарное изменение счётчиков авторов.'''
+
+    def add(self, field, amounts):
+        '''Прибавляет amounts ({user_id: число}, возможно
+        отрицательное) к счётчику field пользователей.
+
+        Строка счётчиков создаётся только для увеличения: уменьшение
+        приходит и из каскадного удаления пользователя, и созданная
+        заново строка ссылалась бы на удаляемого пользователя.'''
+        amounts = {key: value for key, value in amounts.items() if value}
+        if not amounts:
+            return
+        increased = [user_id for user_id, amount in amounts.items()
+                     if amount > 0]
+        if increased:
+            self.bulk_create(
+                [self.model(user_id=user_id) for user_id in increased],
+                ignore_conflicts=True
+            )
+        self.filter(user_id__in=amounts.keys()).update(**{
+            field: Greatest(F(field) + Case(
+                *(When(user_id=user_id, then=Value(amount))
+                  for user_id, amount in amounts.items()),
+                default=Value(0),
+                output_field=models.IntegerField()
+            ), Value(0))
+        })
+
+
+class AuthorStats(models.Model):
+    '''Счётчики пользователя как автора. Поддерживаются сигналами,
+    пересчитываются командой rebuild_counters.'''
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    recipes_count = models.PositiveIntegerField(default=0)
+    subscribers_count = models.PositiveIntegerField(default=0)
+
+    objects = AuthorStatsManager()
+
+    class Meta:
+        verbose_name_plural = 'author stats'
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes import feed
+from users.models import AuthorStats, Subscription
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_added(sender, instance, created, **kwargs):
+    if created:
+        AuthorStats.objects.add('subscribers_count', {instance.author_id: 1})
+        feed.backfill(instance.subscriber_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_removed(sender, instance, **kwargs):
+    AuthorStats.objects.add('subscribers_count', {instance.author_id: -1})
+    feed.remove(instance.subscriber_id, instance.author_id)